@@ -1,5 +1,4 @@
 import streamlit as st
-import xarray as xr
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.collections import LineCollection
@@ -9,6 +8,8 @@ from metpy.units import units
 import numpy as np
 import os
 import datetime
+# One trace reader (h5netcdf when available) shared with the batch plotter
+from plot_skewt import open_trace
 
 # This makes the app use the full width of your screen
 st.set_page_config(page_title="XCBenz Therm", layout="wide")
@@ -95,7 +96,7 @@ def render_time_height_plot(run_folder, location):
     
     for f in files:
         try:
-            ds = xr.open_dataset(f)
+            ds = open_trace(f)
             p = ds["P"].values * units.Pa
             t = (ds["T"].values * units.K).to(units.degC)
             t_kelvin = ds["T"].values * units.K
@@ -228,7 +229,7 @@ def render_time_height_plot(run_folder, location):
 @st.cache_data
 def render_custom_emagram(file_path):
     """The core plotting engine with custom skew and lapse-rate coloring."""
-    ds = xr.open_dataset(file_path)
+    ds = open_trace(file_path)
     
     p = ds["P"].values * units.Pa
     t = (ds["T"].values * units.K).to(units.degC)
@@ -263,10 +264,13 @@ def render_custom_emagram(file_path):
     min_x, max_x = min(np.min(skew_t), np.min(skew_td)), max(np.max(skew_t), np.max(skew_td))
     ax1.set_xlim(min_x - 5, max_x + 5)
 
-    for temp_base in range(-60, 60, 5):
-        ax1.plot([skew_x(temp_base, 0), skew_x(temp_base, 7)], [0, 7], color='blue', alpha=0.04, zorder=1)
-    for theta_base in range(-60, 100, 5):
-        ax1.plot([skew_x(theta_base, 0), skew_x(theta_base-70, 7)], [0, 7], color='brown', alpha=0.06, zorder=1)
+    # Isotherms and dry adiabats, each drawn as a single collection
+    def helper_lines(x0, x1):
+        return np.stack([np.column_stack([x0, np.zeros(len(x0))]), np.column_stack([x1, np.full(len(x1), 7.0)])], axis=1)
+    temp_base = np.arange(-60, 60, 5)
+    theta_base = np.arange(-60, 100, 5)
+    ax1.add_collection(LineCollection(helper_lines(skew_x(temp_base, 0), skew_x(temp_base, 7)), colors='blue', alpha=0.04, zorder=1))
+    ax1.add_collection(LineCollection(helper_lines(skew_x(theta_base, 0), skew_x(theta_base - 70, 7)), colors='brown', alpha=0.06, zorder=1))
 
     dt, dz = np.diff(t_p), np.diff(z_p)
     lapse_rate = -(dt / dz)
@@ -346,12 +350,13 @@ else:
         file_to_plot = os.path.join(CACHE_DIR, selected_run, selected_loc, f"{selected_hor}.nc")
         
         # Header Info
-        ds = xr.open_dataset(file_to_plot)
-        if "valid_time" in ds.attrs:
-            valid_dt = datetime.datetime.fromisoformat(ds.attrs["valid_time"])
+        with open_trace(file_to_plot) as ds:
+            attrs = ds.attrs
+        if "valid_time" in attrs:
+            valid_dt = datetime.datetime.fromisoformat(attrs["valid_time"])
         else:
-            ref = datetime.datetime.fromisoformat(ds.attrs["ref_time"])
-            valid_dt = ref + datetime.timedelta(hours=int(ds.attrs["horizon"]))
+            ref = datetime.datetime.fromisoformat(attrs["ref_time"])
+            valid_dt = ref + datetime.timedelta(hours=int(attrs["horizon"]))
         
         swiss_dt = valid_dt + datetime.timedelta(hours=1) 
 
@@ -1,9 +1,23 @@
 
 import os
-import requests
-import zipfile
-import io
+import sys
+import json
+import hashlib
+import mmap
+import re
+import struct
+import zlib
 import shutil
+import tempfile
+import time
+
+try:
+    # Optional: ISA-L's SIMD DEFLATE/CRC32, a drop-in replacement for zlib (pip install isal)
+    from isal import isal_zlib as deflate
+    HAS_ISAL = True
+except ImportError:
+    deflate = zlib
+    HAS_ISAL = False
 
 # Target directory
 CARTOPY_DIR = os.path.expanduser('~/.local/share/cartopy/shapefiles')
@@ -11,66 +25,537 @@ WDBII_DIR = os.path.join(CARTOPY_DIR, 'wdbii')
 
 # URL for GSHHG (contains WDBII)
 # Using a specific version to ensure compatibility
-URL = "http://www.soest.hawaii.edu/pwessel/gshhg/gshhg-shp-2.3.7.zip"
+GSHHG_VERSION = "2.3.7"
+URL = f"http://www.soest.hawaii.edu/pwessel/gshhg/gshhg-shp-{GSHHG_VERSION}.zip"
+
+# Optional pinned SHA-256 of the archive; the digest is computed while streaming and
+# always printed, so it can be pinned here (or via GSHHG_SHA256) after a trusted download
+ARCHIVE_SHA256 = os.environ.get('GSHHG_SHA256')
+
+# Sidecar with the ETag/Last-Modified of the last extracted archive (for conditional GET)
+ETAG_FILE = os.path.join(WDBII_DIR, '.gshhg.etag')
+# Written only after every river file has been moved into place; tagged with the archive
+# version so a version bump invalidates it. Holds the extracted levels ("all" by default).
+DONE_FILE = os.path.join(WDBII_DIR, f'.river_h_v{GSHHG_VERSION}.done')
+# Cached river layer names from the remote central directory (for --stream); tagged like
+# DONE_FILE, with the levels stored next to the names, so a stale selection is read again
+LAYERS_FILE = os.path.join(WDBII_DIR, f'.gshhg_v{GSHHG_VERSION}.layers.json')
+
+# Shapefile components we keep for each river layer, e.g. gshhg-shp-2.3.7/WDBII_shp/h/WDBII_river_h_L01.shp
+RIVER_RE = re.compile(r"WDBII_shp/(?:[^/]+/)*h/WDBII_river_h_([^/.]+)\.(?:shp|dbf|shx|prj)$")
+
+# Optional subset of river levels to extract, e.g. WDBII_LEVELS=L01,L02 for the major rivers only.
+# Default is all levels, since plot_ncl_style.py draws L01-L11.
+WDBII_LEVELS = frozenset(l.strip() for l in os.environ.get('WDBII_LEVELS', '').split(',') if l.strip())
+
+# ZIP record sizes/signatures (see PKWARE APPNOTE)
+EOCD_SIG = b'PK\x05\x06'
+EOCD_SIZE = 22
+CDH_SIZE = 46
+LFH_SIZE = 30
+# Compression methods inflate_entry handles (same values as zipfile.ZIP_STORED/ZIP_DEFLATED)
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Parallel range downloads (one per shapefile component)
+MAX_WORKERS = 8
+
+# Retries with exponential backoff (0.5s, 1s, 2s, ...) for flaky connections
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5
+
+class IncompleteDownload(IOError):
+    """The server closed the connection before sending all expected bytes."""
+
+def transient_errors():
+    """Errors while streaming a body that are worth retrying (connect errors/5xx are retried by the adapter)."""
+    # Imported lazily: requests/urllib3 are only needed once we actually hit the network
+    import requests
+    import urllib3
+    return (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        urllib3.exceptions.ProtocolError,
+        urllib3.exceptions.ReadTimeoutError,
+        IncompleteDownload,
+    )
+
+def is_river_entry(name):
+    """True for the high-res (h) WDBII river shapefile components inside the archive."""
+    m = RIVER_RE.search(name)
+    return m is not None and (not WDBII_LEVELS or m.group(1) in WDBII_LEVELS)
+
+def levels_key():
+    """Identifies the extracted level set, so changing WDBII_LEVELS triggers a re-extraction."""
+    return ','.join(sorted(WDBII_LEVELS)) if WDBII_LEVELS else 'all'
+
+def is_extracted():
+    """Single stat/read of the sentinel instead of listing the river directory."""
+    try:
+        with open(DONE_FILE, 'r') as f:
+            return f.read().strip() == levels_key()
+    except OSError:
+        return False
+
+def load_validators():
+    """Returns the saved ETag/Last-Modified headers, or {} if unknown."""
+    if not os.path.exists(ETAG_FILE):
+        return {}
+    try:
+        with open(ETAG_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_validators(headers):
+    """Atomically persists the validators of a successfully extracted archive."""
+    validators = {k: headers[k] for k in ('ETag', 'Last-Modified') if headers.get(k)}
+    if not validators:
+        return
+    tmp_file = ETAG_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(validators, f)
+    os.replace(tmp_file, ETAG_FILE)
+
+def backoff(attempt, error):
+    """Sleeps before the next attempt, or re-raises once the retries are used up."""
+    if attempt == MAX_RETRIES - 1:
+        raise error
+    delay = RETRY_BACKOFF * 2 ** attempt
+    print(f"Transient error ({error}), retrying in {delay:.1f}s...")
+    time.sleep(delay)
+
+def with_retries(fn, *args):
+    """Calls fn(*args), retrying transient network errors with exponential backoff."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return fn(*args)
+        except transient_errors() as e:
+            backoff(attempt, e)
+
+def partial_path(target_path):
+    """Temp name next to target_path, so the final os.replace stays on one filesystem."""
+    return f"{target_path}.tmp.{os.getpid()}"
+
+def commit_files(pending):
+    """Moves the fully written (partial, target) files into place."""
+    for partial, target_path in pending:
+        os.replace(partial, target_path)
+
+def print_summary(pending, started):
+    """One progress line for the whole extraction instead of one per file."""
+    elapsed = max(time.monotonic() - started, 1e-6)
+    size_mb = sum(os.path.getsize(target_path) for _, target_path in pending) / 1e6
+    names = ', '.join(os.path.basename(target_path) for _, target_path in pending)
+    print(f"Extracted {len(pending)} files ({size_mb:.1f} MB in {elapsed:.1f}s, {size_mb / elapsed:.1f} MB/s): {names}")
+
+def discard_files(pending):
+    """Removes partial files left behind by a failed extraction."""
+    for partial, _ in pending:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+def fetch_range(session, start, end):
+    """Returns bytes [start, end) of the archive, or None if the server ignores Range."""
+    with session.get(URL, headers={'Range': f'bytes={start}-{end - 1}'}, stream=True, timeout=30) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            return None
+        return r.content
+
+def locate_central_directory(buf, search_from=0):
+    """
+    Finds the EOCD record in buf (bytes or mmap), searching from search_from onwards.
+    Returns (n_entries, cd_size, cd_offset), or None if there is none or the archive is Zip64.
+    """
+    pos = buf.rfind(EOCD_SIG, search_from)
+    if pos < 0:
+        return None
+    _, _, _, _, n_entries, cd_size, cd_offset, _ = struct.unpack_from('<IHHHHIIH', buf, pos)
+    if cd_offset == 0xFFFFFFFF or n_entries == 0xFFFF:
+        return None # Zip64, let zipfile deal with it
+    return n_entries, cd_size, cd_offset
+
+def parse_central_directory(buf, pos, n_entries):
+    """
+    Walks n_entries central directory headers in buf starting at pos, without building ZipInfo objects.
+    Returns a list of (name, offset, comp_size, method, crc).
+    """
+    entries = []
+    for _ in range(n_entries):
+        (_, _, _, flags, method, _, _, crc, comp_size, _,
+         n_len, e_len, c_len, _, _, _, offset) = struct.unpack_from('<IHHHHHHIIIHHHHHII', buf, pos)
+        raw_name = buf[pos + CDH_SIZE:pos + CDH_SIZE + n_len]
+        name = raw_name.decode('utf-8' if flags & 0x800 else 'cp437')
+        entries.append((name, offset, comp_size, method, crc))
+        pos += CDH_SIZE + n_len + e_len + c_len
+    return entries
+
+def select_layers(entries):
+    """River entries grouped by layer basename, skipping layers without a .shp (sorted, one pass)."""
+    layers = {}
+    for entry in entries:
+        if is_river_entry(entry[0]):
+            layers.setdefault(os.path.splitext(entry[0])[0], []).append(entry)
+    return [e for base, group in sorted(layers.items())
+            if any(g[0] == base + ".shp" for g in group) for e in group]
+
+def read_central_directory(session, size):
+    """
+    Fetches and parses the central directory of the remote archive.
+    Returns (entries, cd_offset) with entries as (name, offset, comp_size, method, crc),
+    or None if the archive can't be handled this way (no Range support, Zip64).
+    """
+    # The EOCD record sits at the very end, followed by a comment of at most 64KB
+    tail_start = max(0, size - (65535 + EOCD_SIZE))
+    tail = with_retries(fetch_range, session, tail_start, size)
+    if tail is None:
+        return None
+    cd_info = locate_central_directory(tail)
+    if cd_info is None:
+        return None
+    n_entries, cd_size, cd_offset = cd_info
+
+    if cd_offset >= tail_start:
+        return parse_central_directory(tail, cd_offset - tail_start, n_entries), cd_offset
+    cd = with_retries(fetch_range, session, cd_offset, cd_offset + cd_size)
+    if cd is None:
+        return None
+    return parse_central_directory(cd, 0, n_entries), cd_offset
+
+def inflate_entry(src, entry, target_path):
+    """
+    Reads a local file header plus the entry's data from src (positioned at the entry offset)
+    and inflates it straight to target_path, checking the CRC.
+    """
+    name, offset, comp_size, method, crc = entry
+    if method not in (ZIP_STORED, ZIP_DEFLATED):
+        raise IOError(f"Unsupported compression method {method} for {name}")
+
+    # Local header name/extra lengths can differ from the central directory copy
+    header = src.read(LFH_SIZE)
+    n_len, e_len = struct.unpack_from('<HH', header, 26)
+    src.read(n_len + e_len)
+
+    decomp = deflate.decompressobj(-15) if method == ZIP_DEFLATED else None
+    remaining = comp_size
+    crc_calc = 0
+    with open(target_path, 'wb') as f:
+        while remaining:
+            chunk = src.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise IncompleteDownload(f"Truncated data for {name}")
+            remaining -= len(chunk)
+            data = decomp.decompress(chunk) if decomp else chunk
+            crc_calc = deflate.crc32(data, crc_calc)
+            f.write(data)
+        if decomp:
+            data = decomp.flush()
+            crc_calc = deflate.crc32(data, crc_calc)
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if crc_calc != crc:
+        raise IOError(f"CRC mismatch for {name}")
+
+def extract_entry_range(session, entry, end, target_path):
+    """Range-fetches a single entry [offset, end) and inflates it straight to target_path."""
+    with session.get(URL, headers={'Range': f'bytes={entry[1]}-{end - 1}'}, stream=True, timeout=30) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise IOError("Server stopped honouring Range requests")
+        inflate_entry(r.raw, entry, target_path)
+
+def extract_via_ranges(session, size, target_dir):
+    """
+    Extracts the river files using HTTP Range requests for the central directory
+    and the wanted entries only (a few MB instead of ~170MB).
+    Returns False if the server/archive doesn't allow it, so the caller can fall back.
+    """
+    result = read_central_directory(session, size)
+    if result is None:
+        return False
+    entries, cd_offset = result
 
-def main():
+    # Each entry ends where the next one (or the central directory) starts
+    boundaries = sorted({e[1] for e in entries} | {cd_offset})
+    next_offset = {b: boundaries[i + 1] for i, b in enumerate(boundaries[:-1])}
+
+    wanted = select_layers(entries)
+    if not wanted:
+        return False
+
+    # Imported lazily like requests: the already-extracted path never gets here
+    from concurrent.futures import ThreadPoolExecutor
+    os.makedirs(target_dir, exist_ok=True)
+    started = time.monotonic()
+    pending = []
+    try:
+        # Entries are independent, so overlap their round-trips over the pooled session
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = []
+            for entry in wanted:
+                filename = os.path.basename(entry[0])
+                target_path = os.path.join(target_dir, filename)
+                pending.append((partial_path(target_path), target_path))
+                futures.append(pool.submit(with_retries, extract_entry_range, session, entry, next_offset[entry[1]], pending[-1][0]))
+            for fut in futures:
+                fut.result()
+        commit_files(pending)
+        print_summary(pending, started)
+    finally:
+        discard_files(pending)
+    return True
+
+class MmapFile:
+    """Minimal read-only file interface over an mmap (mmap lacks seekable() before Python 3.13)."""
+    def __init__(self, mm):
+        self._mm = mm
+
+    def read(self, n=-1):
+        return self._mm.read(n)
+
+    def seek(self, pos, whence=os.SEEK_SET):
+        self._mm.seek(pos, whence)
+        return self._mm.tell()
+
+    def tell(self):
+        return self._mm.tell()
+
+    def seekable(self):
+        return True
+
+def extract_with_zipfile(mm, target_dir, pending):
+    """Fallback for archives the manual parser doesn't handle (Zip64), via zipfile over the mmap."""
+    import zipfile
+    with zipfile.ZipFile(MmapFile(mm)) as z:
+        # Keep the ZipInfo objects so extraction skips the name -> header lookup
+        infos = {info.filename: info for info in z.infolist()}
+        for name, *_ in select_layers([(n, 0, 0, 0, 0) for n in infos]):
+            target_path = os.path.join(target_dir, os.path.basename(name))
+            pending.append((partial_path(target_path), target_path))
+            extract_member(z, infos[name], pending[-1][0])
+
+def extract_member(z, info, target_path):
+    """Streams a single zip member (ZipInfo) to target_path without decompressing it fully into memory."""
+    with open(target_path, 'wb') as dst:
+        if info.file_size == 0:
+            return
+        with z.open(info) as src:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+def download_archive(session, headers, f):
+    """
+    Streams the archive into f, resuming with a Range request after transient errors.
+    The bytes are hashed on the way, so no second pass over the file is needed.
+    Returns (response headers, SHA-256 hex digest), or None if the server answered 304 Not Modified.
+    """
+    written = 0
+    digest = None
+    response_headers = None
+    for attempt in range(MAX_RETRIES):
+        req_headers = dict(headers)
+        if written:
+            # Resume where we stopped, but only if the archive is still the same one
+            req_headers = {'Range': f'bytes={written}-'}
+            if response_headers.get('ETag'):
+                req_headers['If-Range'] = response_headers['ETag']
+        try:
+            with session.get(URL, headers=req_headers, stream=True, timeout=30) as r:
+                if r.status_code == 304:
+                    return None
+                r.raise_for_status()
+                if r.status_code != 206:
+                    # Fresh download (or the server ignored the resume request): start over
+                    f.seek(0)
+                    f.truncate()
+                    written = 0
+                    digest = hashlib.sha256()
+                    response_headers = r.headers
+                r.raw.decode_content = True
+                while True:
+                    chunk = r.raw.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    written += len(chunk)
+            # Only a plain (not content-encoded) 200 tells us the full archive size
+            expected = 0 if 'Content-Encoding' in response_headers else int(response_headers.get('Content-Length', 0))
+            if expected and written != expected:
+                raise IncompleteDownload(f"Got {written} of {expected} bytes")
+            return response_headers, digest.hexdigest()
+        except transient_errors() as e:
+            backoff(attempt, e)
+
+def download_and_extract(session, headers, target_dir):
+    """Downloads the whole archive and extracts the river files from it."""
+    tmp_path = None
+    pending = []
+    try:
+        # Stream the archive to a temp file instead of holding ~170MB in memory
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp:
+            tmp_path = tmp.name
+            result = download_archive(session, headers, tmp)
+        if result is None:
+            return None
+        response_headers, sha256 = result
+        print(f"Archive SHA-256: {sha256}")
+        if ARCHIVE_SHA256 and sha256 != ARCHIVE_SHA256.lower():
+            raise IOError(f"Archive checksum mismatch (expected {ARCHIVE_SHA256})")
+
+        print("Download complete. Extracting...")
+        started = time.monotonic()
+
+        # Header parsing and member reads become page faults instead of small read() syscalls
+        with open(tmp_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Structure in zip: gshhg-shp-2.3.7/WDBII_shp/h/WDBII_river_h_L01.shp
+            # We want to place them in: .../wdbii/river/h/
+            os.makedirs(target_dir, exist_ok=True)
+            cd_info = locate_central_directory(mm, max(0, len(mm) - (65535 + EOCD_SIZE)))
+            if cd_info is None:
+                extract_with_zipfile(mm, target_dir, pending)
+            else:
+                n_entries, _, cd_offset = cd_info
+                wanted = select_layers(parse_central_directory(mm, cd_offset, n_entries))
+
+                # Central directory has been scanned; member reads jump around the archive from here
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+                    mm.madvise(mmap.MADV_RANDOM)
+
+                for entry in wanted:
+                    target_path = os.path.join(target_dir, os.path.basename(entry[0]))
+                    pending.append((partial_path(target_path), target_path))
+                    mm.seek(entry[1])
+                    inflate_entry(mm, entry, pending[-1][0])
+        commit_files(pending)
+        print_summary(pending, started)
+        return response_headers
+    finally:
+        discard_files(pending)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def fetch_archive(session, headers, river_dir):
+    """Revalidates and extracts the archive, preferring Range requests over a full download."""
+    head = session.head(URL, headers=headers, allow_redirects=True, timeout=30)
+    if head.status_code == 304:
+        print("Archive not modified on server. Skipping download.")
+        return
+    head.raise_for_status()
+
+    # Invalidate the previous extraction until this one has fully succeeded
+    if os.path.exists(DONE_FILE):
+        os.remove(DONE_FILE)
+
+    size = int(head.headers.get('Content-Length', 0))
+    response_headers = None
+    if size and head.headers.get('Accept-Ranges') == 'bytes':
+        print(f"Fetching WDBII river files from {URL} via Range requests...")
+        if extract_via_ranges(session, size, river_dir):
+            response_headers = head.headers
+
+    if response_headers is None:
+        print(f"Downloading GSHHG/WDBII data from {URL}...")
+        print("This might take a while (approx 170MB)...")
+        response_headers = download_and_extract(session, headers, river_dir)
+        if response_headers is None:
+            print("Archive not modified on server. Skipping download.")
+            return
+
+    save_validators(response_headers)
+    with open(DONE_FILE, 'w') as f:
+        f.write(levels_key())
+    print("Extraction complete.")
+
+def stream_paths(session):
+    """
+    Returns GDAL /vsizip//vsicurl/ paths for the river layers, so readers such as
+    pyogrio can read them straight from the remote zip via Range requests (no extraction).
+    """
+    # GDAL only range-reads .zip URLs when allowed, and VSI_CACHE keeps fetched blocks around
+    os.environ.setdefault('CPL_VSIL_CURL_ALLOWED_EXTENSIONS', '.zip')
+    os.environ.setdefault('VSI_CACHE', 'YES')
+
+    layers = None
+    if os.path.exists(LAYERS_FILE):
+        try:
+            with open(LAYERS_FILE, 'r') as f:
+                cached = json.load(f)
+            if cached.get('levels') == levels_key():
+                layers = cached['layers']
+        except (OSError, ValueError, AttributeError, KeyError):
+            layers = None
+
+    if layers is None:
+        head = session.head(URL, allow_redirects=True, timeout=30)
+        head.raise_for_status()
+        result = read_central_directory(session, int(head.headers.get('Content-Length', 0)))
+        if result is None:
+            raise IOError("Server does not support Range requests, --stream is unavailable")
+        layers = sorted(e[0] for e in result[0] if e[0].endswith('.shp') and is_river_entry(e[0]))
+        os.makedirs(WDBII_DIR, exist_ok=True)
+        with open(LAYERS_FILE, 'w') as f:
+            json.dump({'levels': levels_key(), 'layers': layers}, f)
+
+    return [f"/vsizip//vsicurl/{URL}/{name}" for name in layers]
+
+def make_session():
+    """One keep-alive session for HEAD, range and full GETs, sized for the worker pool."""
+    import requests
+    import urllib3
+    session = requests.Session()
+    # Connect errors and busy/failing servers are retried before any body is read
+    retry = urllib3.util.Retry(total=MAX_RETRIES, backoff_factor=RETRY_BACKOFF,
+                               status_forcelist=[429, 500, 502, 503, 504],
+                               allowed_methods=frozenset({'HEAD', 'GET'}))
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def main(refresh=False):
     print(f"Checking for WDBII data in {WDBII_DIR}...")
-    
+
     # Check if we need to download
     # We need rivers, high resolution (h)
     # Expected path: wdbii/river/WDBII_river_h_L01.shp (structure usually inside zip is WDBII_shp/h/WDBII_river_h_L01.shp)
-    
-    # Let's just download and extract if the wdbii dir is empty or missing
-    if os.path.exists(WDBII_DIR) and os.listdir(WDBII_DIR):
-        print("WDBII directory exists and is not empty. Checking for river files...")
-        # Check specifically for river h
-        river_dir = os.path.join(WDBII_DIR, "river", "h")
-        if os.path.exists(river_dir) and len(os.listdir(river_dir)) > 0:
-             print("River files seem present. Skipping download.")
-             return
-
-    print(f"Downloading GSHHG/WDBII data from {URL}...")
-    print("This might take a while (approx 170MB)...")
-    
+    river_dir = os.path.join(WDBII_DIR, "river", "h")
+
+    # The sentinel is only written once a full extraction has completed
+    # With --refresh we skip the local check and revalidate against the server instead
+    extracted = is_extracted()
+    if not refresh and extracted:
+        print("River files present. Skipping download.")
+        return
+
+    # Conditional GET: only worth sending if the previous extraction is still on disk
+    headers = {}
+    if extracted:
+        validators = load_validators()
+        if 'ETag' in validators:
+            headers['If-None-Match'] = validators['ETag']
+        if 'Last-Modified' in validators:
+            headers['If-Modified-Since'] = validators['Last-Modified']
+
+    # Only needed for the Zip64 fallback's errors, so skipped when the files are already there
+    import zipfile
     try:
-        r = requests.get(URL, stream=True)
-        r.raise_for_status()
-        
-        print("Download complete. Extracting...")
-        
-        with zipfile.ZipFile(io.BytesIO(r.content)) as z:
-            # List files to verify structure
-            # Structure in zip: gshhg-shp-2.3.7/WDBII_shp/h/WDBII_river_h_L01.shp
-            
-            for file in z.namelist():
-                if "WDBII_shp" in file and "river" in file and "/h/" in file and file.endswith(".shp"):
-                     # Extract this file
-                     # We want to place it in: .../wdbii/river/h/
-                     
-                     filename = os.path.basename(file)
-                     target_dir = os.path.join(WDBII_DIR, "river", "h")
-                     os.makedirs(target_dir, exist_ok=True)
-                     
-                     target_path = os.path.join(target_dir, filename)
-                     
-                     print(f"Extracting {filename} to {target_path}")
-                     with open(target_path, 'wb') as f:
-                         f.write(z.read(file))
-                         
-                     # Also extract .dbf and .shx if they exist (usually do)
-                     base_no_ext = os.path.splitext(file)[0]
-                     for ext in ['.dbf', '.shx', '.prj']:
-                         sibling = base_no_ext + ext
-                         if sibling in z.namelist():
-                             s_filename = os.path.basename(sibling)
-                             s_target = os.path.join(target_dir, s_filename)
-                             with open(s_target, 'wb') as sf:
-                                 sf.write(z.read(sibling))
-
-        print("Extraction complete.")
-        
-    except Exception as e:
+        with make_session() as session:
+            fetch_archive(session, headers, river_dir)
+    except (OSError, zipfile.BadZipFile) as e:
+        # OSError covers requests' exceptions as well as local I/O and integrity errors
         print(f"Download/Extraction failed: {e}")
 
 if __name__ == "__main__":
-    main()
+    if "--stream" in sys.argv:
+        # Print remote layer paths instead of extracting (the default stays on disk for cartopy)
+        with make_session() as session:
+            for path in stream_paths(session):
+                print(path)
+    else:
+        main(refresh="--refresh" in sys.argv)
@@ -1,10 +1,34 @@
-import os, sys
+import os, sys, re, errno
 import datetime, json, xarray as xr
 import numpy as np
 import warnings
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import shutil
+import functools
+import pickle
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from scipy.spatial import cKDTree
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+try:
+    import h5py, h5netcdf  # noqa: F401
+    HAS_H5NETCDF = True
+except ImportError:
+    HAS_H5NETCDF = False
 
 # Set GRIB definitions for COSMO/ICON
 COSMO_DEFS = r"C:\Users\sebas\.conda\envs\weather_final\share\eccodes-cosmo-resources\definitions"
@@ -34,10 +58,42 @@ CACHE_DIR_MAPS = "cache_wind"
 STATIC_DIR = "static_data"
 HHL_FILENAME = "vertical_constants_icon-ch1-eps.grib2"
 HGRID_FILENAME = "horizontal_constants_icon-ch1-eps.grib2"
+# Pickled (grid, KD-tree) derived from HGRID, rebuilt when HGRID is newer
+GRID_CACHE_FILENAME = "grid_tree.pkl"
 STAC_BASE_URL = "https://data.geo.admin.ch/api/stac/v1/collections/ch.meteoschweiz.ogd-forecasting-icon-ch1"
 STAC_ASSETS_URL = f"{STAC_BASE_URL}/assets"
+STAC_SEARCH_URL = "https://data.geo.admin.ch/api/stac/v1/search"
+# Reference time and lead time (hours) as they appear in OGD asset file names
+ASSET_KEY_RE = re.compile(r"-(?P<ref_time>\d{12})-(?P<lead_time>\d+)-")
+# h5netcdf has less open/close overhead for the many small trace files; readers are unaffected
+NC_ENGINE = "h5netcdf" if HAS_H5NETCDF else None
+# DEFLATE levels (0 = uncompressed). Trace profiles are a few hundred values: compressing
+# them forces chunked HDF5 storage, whose metadata outweighs the savings. Wind maps span
+# every cell, so I/O dominates there.
+TRACE_COMPLEVEL = 0
+MAP_COMPLEVEL = 3
+# cfgrib index kept next to the static GRIBs, so later runs skip rescanning them
+STATIC_INDEXPATH = "{path}.{short_hash}.idx"
 
 WIND_LEVELS = []
+# The wind-map step needs U/V/HHL on every cell; while it is off, fields stay lazy
+ENABLE_WIND_MAPS = False
+# Horizons downloaded ahead of the one being processed (each holds len(VARS_TRACES) GRIBs)
+HORIZON_PREFETCH = 1
+MAX_DOWNLOAD_WORKERS = len(VARS_TRACES) * (HORIZON_PREFETCH + 1)
+# Queued NetCDF writes before the main loop waits for the writer (trace files are a few KB)
+MAX_PENDING_WRITES = 256
+# Where downloaded GRIBs live for one horizon (default: working directory). Pointing this at
+# a tmpfs such as /dev/shm keeps them in RAM, but it must hold MAX_DOWNLOAD_WORKERS full-domain
+# files; if it fills up, downloads fall back to the working directory.
+GRIB_TMP_DIR = os.environ.get("GRIB_TMP_DIR", "")
+
+_session = None
+_session_lock = threading.Lock()
+# Full-level heights derived from the static HHL, shared by all horizons of a run
+_hfl_cache = {}
+# Static grid coordinates, see load_static_grid()
+_grid_cache = None
 
 os.makedirs(CACHE_DIR_TRACES, exist_ok=True)
 os.makedirs(CACHE_DIR_MAPS, exist_ok=True)
@@ -47,12 +103,41 @@ def get_iso_horizon(total_hours):
     hours = total_hours % 24
     return f"P{days}DT{hours}H"
 
+# Longest forecast is the 03 UTC run (45 h); the others stop at 33 h
+MAX_HORIZON = 45
+ISO_HORIZONS = [get_iso_horizon(h) for h in range(MAX_HORIZON + 1)]
+TRACE_FILENAMES = [f"H{h:02d}.nc" for h in range(MAX_HORIZON + 1)]
+
+_UMLAUTS = str.maketrans({"ü": "ue", "ö": "oe", "ä": "ae", "Ü": "Ue", "Ö": "Oe", "Ä": "Ae", "ß": "ss"})
+# Unicode \w is exactly str.isalnum() plus '_', so other accented letters are kept as before
+_UNSAFE_CHARS = re.compile(r"[^\w-]")
+
 def sanitize_name(name):
-    n = name.replace("ü", "ue").replace("ö", "oe").replace("ä", "ae") \
-            .replace("Ü", "Ue").replace("Ö", "Oe").replace("Ä", "Ae").replace("ß", "ss")
-    clean = "".join(c for c in n if c.isalnum() or c in ('-', '_'))
+    clean = _UNSAFE_CHARS.sub("", name.translate(_UMLAUTS))
     return clean if clean else "unnamed"
 
+def load_json(path):
+    """Parses a JSON file, with orjson when it is installed."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+def get_session():
+    """Shared keep-alive session, so repeated downloads reuse their TCP/TLS connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            # One pooled connection per download worker; STAC searches (POST) are retried
+            # on server errors like ogd_api's own session does
+            retries = Retry(total=3, allowed_methods=["POST"], status_forcelist=[500], backoff_factor=0.25)
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_DOWNLOAD_WORKERS, max_retries=retries)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            # ogd_api fallback lookups go through the same pool instead of their own
+            ogd_api.session = _session
+        return _session
+
 def log(msg, level="INFO"):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     with open("debug_log.txt", "a") as f:
@@ -65,14 +150,18 @@ def download_file(url, target_path, max_retries=3):
     for attempt in range(max_retries):
         try:
             log(f"Downloading {url} to {target_path}...")
-            with requests.get(url, stream=True, timeout=30) as r:
+            with get_session().get(url, stream=True, timeout=30) as r:
                 r.raise_for_status()
+                r.raw.decode_content = True
                 with open(target_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=1024*1024):
-                        f.write(chunk)
+                    shutil.copyfileobj(r.raw, f, 1024 * 1024)
             log(f"Download complete: {target_path}")
             return True
         except Exception as e:
+            # A full target filesystem won't recover by retrying: let the caller choose another
+            if getattr(e, "errno", None) == errno.ENOSPC:
+                if os.path.exists(target_path): os.remove(target_path)
+                raise
             log(f"Download attempt {attempt+1} failed: {e}", "ERROR")
             if attempt < max_retries - 1:
                 time.sleep(backoff ** attempt)
@@ -92,7 +181,7 @@ def get_latest_available_runs(limit=1):
         
         params = {"limit": 1, "forecast:reference_datetime": ref}
         try:
-            r = requests.get(f"{STAC_BASE_URL}/items", params=params, timeout=10)
+            r = get_session().get(f"{STAC_BASE_URL}/items", params=params, timeout=10)
             if r.status_code == 200 and r.json().get("features"):
                 found_runs.append(cand)
                 log(f"Found available run: {ref}")
@@ -102,108 +191,382 @@ def get_latest_available_runs(limit=1):
 
 def download_static_files():
     os.makedirs(STATIC_DIR, exist_ok=True)
-    for filename in [HHL_FILENAME, HGRID_FILENAME]:
-        path = os.path.join(STATIC_DIR, filename)
-        if not os.path.exists(path):
-            log(f"Downloading static file {filename}...")
-            try:
-                resp = requests.get(STAC_ASSETS_URL, timeout=10)
-                assets = resp.json()["assets"]
-                url = next((a["href"] for a in assets if a.get("id") == filename), None)
-                if url: download_file(url, path)
-            except Exception as e: log(f"Failed to fetch static {filename}: {e}", "ERROR")
+    missing = [f for f in [HHL_FILENAME, HGRID_FILENAME] if not os.path.exists(os.path.join(STATIC_DIR, f))]
+    if not missing: return
+    try:
+        # One asset listing for both files
+        resp = get_session().get(STAC_ASSETS_URL, timeout=10)
+        assets = {a.get("id"): a.get("href") for a in resp.json()["assets"]}
+    except Exception as e: log(f"Failed to fetch static asset listing: {e}", "ERROR"); return
+
+    def fetch(filename):
+        log(f"Downloading static file {filename}...")
+        url = assets.get(filename)
+        if url: download_file(url, os.path.join(STATIC_DIR, filename))
+        else: log(f"Static file {filename} not found in asset listing.", "ERROR")
+
+    with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+        list(pool.map(fetch, missing))
+
+def to_float32(data):
+    """GRIB fields carry far less than float32 precision: keep float64 copies out of the pipeline."""
+    return data.astype(np.float32) if data.dtype == np.float64 else data
 
 def load_static_hhl():
     path = os.path.join(STATIC_DIR, HHL_FILENAME)
     if not os.path.exists(path): return None
     try:
-        ds = xr.open_dataset(path, engine='cfgrib', backend_kwargs={'indexpath': ''})
+        ds = xr.open_dataset(path, engine='cfgrib', backend_kwargs={'indexpath': STATIC_INDEXPATH})
         var = next((v for v in ds.data_vars if v.lower() in ['h', 'hhl']), list(ds.data_vars)[0])
-        hhl = ds[var].load()
+        hhl = to_float32(ds[var].load())
         ds.close()
         return hhl
     except Exception as e: log(f"Error loading HHL: {e}", "ERROR"); return None
 
 def load_static_grid():
+    """Static lat/lon as plain ndarrays, decoded from the HGRID file once per process."""
+    global _grid_cache
+    if _grid_cache is not None: return _grid_cache
     path = os.path.join(STATIC_DIR, HGRID_FILENAME)
     if not os.path.exists(path): return None
     try:
-        ds = xr.open_dataset(path, engine='cfgrib', backend_kwargs={'indexpath': ''})
+        ds = xr.open_dataset(path, engine='cfgrib', backend_kwargs={'indexpath': STATIC_INDEXPATH})
         grid = {}
         for key in ['lat', 'lon']:
             # Search both coordinates and data variables
             match_k = next((k for k in list(ds.coords) + list(ds.data_vars) if key in k.lower()), None)
             if match_k:
-                grid[key] = ds[match_k].load()
+                grid[key] = ds[match_k].values
             else:
                 grid[key] = None
         ds.close()
-        return grid if grid.get('lat') is not None else None
+        if grid.get('lat') is None: return None
+        _grid_cache = grid
+        return grid
     except Exception as e: log(f"Error loading HGRID: {e}", "ERROR"); return None
 
 def is_run_complete_locally(time_tag, locations, max_h):
     last_loc = sanitize_name(list(locations.keys())[-1])
     trace_path = os.path.join(CACHE_DIR_TRACES, time_tag, last_loc, f"H{max_h:02d}.nc")
-    map_path = os.path.join(CACHE_DIR_MAPS, time_tag, f"wind_maps_H{max_h:02d}.nc")
-    return os.path.exists(trace_path) and os.path.exists(map_path)
+    if not os.path.exists(trace_path): return False
+    if not (ENABLE_WIND_MAPS and WIND_LEVELS): return True
+    lvl = WIND_LEVELS[-1]
+    map_path = os.path.join(CACHE_DIR_MAPS, time_tag, f"Wind_{lvl['type']}_{lvl['name']}_{time_tag}_H{max_h:02d}.nc")
+    return os.path.exists(map_path)
+
+def scan_trace_files(time_tag):
+    """Existing trace files of a run as {location_dir: {filenames}}, listed once per run."""
+    existing = {}
+    run_dir = os.path.join(CACHE_DIR_TRACES, time_tag)
+    if not os.path.isdir(run_dir): return existing
+    with os.scandir(run_dir) as it:
+        for entry in it:
+            if entry.is_dir():
+                with os.scandir(entry.path) as files:
+                    existing[entry.name] = {f.name for f in files}
+    return existing
+
+def nc_encoding(ds, complevel):
+    """zlib with byte shuffle for every data variable (none if complevel is 0); shuffle helps
+    DEFLATE on smooth fields. Floating point variables are stored as float32 whatever their
+    in-memory dtype."""
+    enc = {}
+    for v, da in ds.data_vars.items():
+        enc[v] = {"zlib": True, "complevel": complevel, "shuffle": True} if complevel else {}
+        if da.dtype.kind == "f": enc[v]["dtype"] = "float32"
+    return enc
+
+def write_nc(ds, path, complevel):
+    """Writes ds (attrs already set) as NetCDF4 with the preferred engine and compression."""
+    ds.to_netcdf(path, format="NETCDF4", engine=NC_ENGINE, encoding=nc_encoding(ds, complevel))
+
+class BackgroundWriter:
+    """Runs write_nc on one background thread (HDF5 isn't thread-safe) so writes overlap
+    with the next horizon's downloads and decoding. The backlog is bounded."""
+
+    def __init__(self, max_pending=MAX_PENDING_WRITES):
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.pending = deque()
+        self.max_pending = max_pending
+
+    def submit(self, ds, path, complevel):
+        while len(self.pending) >= self.max_pending:
+            self._wait_one()
+        self.pending.append((path, self.pool.submit(write_nc, ds, path, complevel)))
+
+    def _wait_one(self):
+        path, fut = self.pending.popleft()
+        try:
+            fut.result()
+        except Exception as e:
+            log(f"Writing {path} failed: {e}", "ERROR")
+            # A partial file would be taken as cached by the next run
+            if os.path.exists(path): os.remove(path)
+
+    def drain(self):
+        while self.pending:
+            self._wait_one()
+
+    def close(self):
+        self.drain()
+        self.pool.shutdown()
+
+def build_grid_tree(lats, lons):
+    """KD-tree over the (lat, lon) cell centres; the grid is static, so build it once per run."""
+    return cKDTree(np.column_stack([np.ravel(lats), np.ravel(lons)]))
+
+def load_grid_and_tree():
+    """Static grid and its KD-tree, pickled in STATIC_DIR so later runs skip both cfgrib and the build."""
+    global _grid_cache
+    src = os.path.join(STATIC_DIR, HGRID_FILENAME)
+    cache = os.path.join(STATIC_DIR, GRID_CACHE_FILENAME)
+    try:
+        if os.path.getmtime(cache) >= os.path.getmtime(src):
+            with open(cache, "rb") as f:
+                grid, tree = pickle.load(f)
+            _grid_cache = grid
+            return grid, tree
+    except (OSError, EOFError, pickle.UnpicklingError): pass
 
-def process_traces(fields, locations, tag, h, ref):
+    grid = load_static_grid()
+    if grid is None: return None, None
+    tree = build_grid_tree(grid['lat'], grid['lon'])
+    tmp = f"{cache}.tmp.{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump((grid, tree), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError as e:
+        log(f"Could not cache grid tree: {e}", "WARNING")
+        if os.path.exists(tmp): os.remove(tmp)
+    return grid, tree
+
+def get_location_indices(tree, locations):
+    """Nearest grid cell per location, all locations in a single query."""
+    pts = np.array([[c['lat'], c['lon']] for c in locations.values()])
+    _, idxs = tree.query(pts, k=1, workers=-1)
+    return dict(zip(locations.keys(), np.atleast_1d(idxs).tolist()))
+
+def list_run_assets(ref_time):
+    """Control-run asset URLs of VARS_TRACES as {(var, horizon): url}.
+
+    One paged STAC search per variable covers every published horizon, instead
+    of one get_asset_urls round-trip per variable and horizon.
+    """
+    ref = ref_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    assets = {}
+    for var in VARS_TRACES:
+        url = STAC_SEARCH_URL
+        body = {"collections": ["ch.meteoschweiz.ogd-forecasting-icon-ch1"], "forecast:variable": var,
+                "forecast:reference_datetime": ref, "forecast:perturbed": False}
+        while url:
+            r = get_session().post(url, json=body, timeout=30)
+            r.raise_for_status()
+            obj = r.json()
+            for item in obj.get("features", []):
+                for asset in item.get("assets", {}).values():
+                    m = ASSET_KEY_RE.search(urlparse(asset["href"]).path)
+                    if m: assets[(var, int(float(m.group("lead_time"))))] = asset["href"]
+            nxt = next((l for l in obj.get("links", []) if l.get("rel") == "next"), None)
+            url = nxt["href"] if nxt else None
+            if nxt: body = body | nxt.get("body", {})
+    return assets
+
+@functools.lru_cache(maxsize=256)
+def get_asset_urls_cached(var, ref_iso, iso_h):
+    """ogd_api asset URLs of one variable/run/horizon, memoised for the process lifetime.
+
+    Keyed on ref_time.isoformat() so the arguments are hashable. Shared with the legacy
+    fetch scripts, so a driver running several of them never repeats a lookup.
+    """
+    # Over the shared session
+    get_session()
+    req = ogd_api.Request(collection="ogd-forecasting-icon-ch1", variable=var,
+                         reference_datetime=datetime.datetime.fromisoformat(ref_iso), horizon=iso_h, perturbed=False)
+    return tuple(ogd_api.get_asset_urls(req))
+
+def fetch_var(var, ref_time, iso_h, tag, h, url=None):
+    """Resolves and downloads one variable's GRIB for a horizon. Returns the temp path or None."""
+    if url is None:
+        # Not in the run listing (yet): ask ogd_api
+        urls = get_asset_urls_cached(var, ref_time.isoformat(), iso_h)
+        if not urls: return None
+        url = urls[0]
+    name = f"temp_{var}_{tag}_{h:02d}.grib2"
+    tmp = os.path.join(GRIB_TMP_DIR, name)
+    try:
+        return tmp if download_file(url, tmp) else None
+    except OSError as e:
+        if e.errno != errno.ENOSPC or not GRIB_TMP_DIR: raise
+        log(f"{GRIB_TMP_DIR} is full, downloading {var} H+{h:02d} to the working directory", "WARNING")
+        return name if download_file(url, name) else None
+
+def load_var(tmp, grid, lazy=False):
+    """Opens a downloaded GRIB with grid coords attached.
+
+    Eager loads decode the whole field and remove the file. Lazy ones stay
+    file-backed until the caller selects its points; the caller closes them
+    and removes the file once done. cfgrib only supports basic indexing, so a
+    point selection still decodes the min..max cell span of every message
+    (in practice the whole field) and keeps just the selected cells.
+    """
+    ds = xr.open_dataset(tmp, engine='cfgrib', backend_kwargs={'indexpath': ''})
+    try:
+        data = ds[next(iter(ds.data_vars))]
+        if not lazy: data = to_float32(data.load())
+        if grid:
+            m_dim = next(d for d in data.dims if data.sizes[d] == grid['lat'].size)
+            data = data.assign_coords({"latitude": (m_dim, grid['lat']), "longitude": (m_dim, grid['lon'])})
+    except:
+        ds.close()
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    if lazy:
+        data.set_close(ds.close)
+        return data
+    ds.close()
+    if os.path.exists(tmp): os.remove(tmp)
+    return data
+
+def process_traces(fields, locations, tag, h, ref, tree=None, existing=None, safe_names=None, indices=None, writer=None):
     sample = list(fields.values())[0]
     lat_n = 'latitude' if 'latitude' in sample.coords else 'lat'
     lon_n = 'longitude' if 'longitude' in sample.coords else 'lon'
-    lats, lons = sample[lat_n].values, sample[lon_n].values
-    indices = {n: int(np.argmin((lats-c['lat'])**2+(lons-c['lon'])**2)) for n, c in locations.items()}
-
+    if indices is None:
+        if tree is None:
+            tree = build_grid_tree(sample[lat_n].values, sample[lon_n].values)
+        indices = get_location_indices(tree, locations)
+    if safe_names is None:
+        safe_names = {name: sanitize_name(name) for name in locations}
+
+    # New Naming: [Location]_[RunTag]_H[horizon].nc
+    # `existing` (from scan_trace_files) replaces per-file stats and is kept up to date
+    filename = TRACE_FILENAMES[h]
+    pending = {}
     for name, idx in indices.items():
-        # New Naming: [Location]_[RunTag]_H[horizon].nc
-        safe_name = sanitize_name(name)
+        safe_name = safe_names[name]
         loc_dir = os.path.join(CACHE_DIR_TRACES, tag, safe_name)
-        os.makedirs(loc_dir, exist_ok=True)
-        filename = f"H{h:02d}.nc"
         path = os.path.join(loc_dir, filename)
-        
-        if os.path.exists(path): continue
-
+        if existing is None:
+            os.makedirs(loc_dir, exist_ok=True)
+            if os.path.exists(path): continue
+        else:
+            if safe_name not in existing:
+                os.makedirs(loc_dir, exist_ok=True)
+                existing[safe_name] = set()
+            if filename in existing[safe_name]: continue
+        pending[name] = (idx, path)
+    if not pending: return
+
+    # All fields share the grid: view them as one lazy Dataset, select every outstanding
+    # location with a single isel and materialise it in one compute; split per location below.
+    # Lazy fields are decoded one variable at a time over the selected cell span, so the
+    # peak is about one full field rather than all of them.
+    # Coords differ between fields (e.g. static HHL has no step) and aren't written anyway.
+    names = list(pending)
+    loc_idx = xr.DataArray(np.fromiter((pending[n][0] for n in names), dtype=np.int64, count=len(names)), dims="loc")
+    s_dim = sample[lat_n].dims[0]
+    squeezed = {var: ds.squeeze() for var, ds in fields.items()}
+    merged = xr.Dataset({var: da.drop_vars(list(da.coords)) for var, da in squeezed.items()})
+    batched = merged.isel({s_dim: loc_idx}).compute().map(to_float32)
+
+    # Plain arrays with the location axis first; the vertical dim is written as 'level'.
+    # Coords were dropped above, so there is nothing left to rename or drop per location.
+    arrays = {}
+    for var, da in batched.data_vars.items():
+        vdims = [d for d in da.dims if d != "loc"]
+        arrays[var] = (da.transpose("loc", *vdims).values, ["level"] + vdims[1:] if vdims else [])
+
+    ref_iso, valid_iso = ref.isoformat(), (ref + datetime.timedelta(hours=h)).isoformat()
+    for j, name in enumerate(names):
+        path = pending[name][1]
         loc_vars = {}
-        hhl_profile = None
         
         # 1. First, check if HHL is available to determine the target level count
-        if "HHL" in fields:
-            ds_hhl = fields["HHL"]
-            s_dim = ds_hhl[lat_n].dims[0]
-            z_dim = ds_hhl.dims[0] # Usually the vertical dimension
-            hhl_profile = ds_hhl.squeeze().isel({s_dim: idx}).compute()
+        if "HHL" in arrays:
             # Calculate cell-center heights (80 values from 81 half-levels)
-            h_vals = hhl_profile.values
+            h_vals = arrays["HHL"][0][j]
             height_centers = (h_vals[:-1] + h_vals[1:]) / 2.0
             
             # Create a DataArray for HEIGHT
             loc_vars["HEIGHT"] = xr.DataArray(height_centers, dims=["level"])
 
         # 2. Process all other variables
-        for var, ds in fields.items():
+        for var, (arr, dims) in arrays.items():
             if var == "HHL": continue # Skip raw HHL
-            
-            s_dim = ds[lat_n].dims[0]
-            profile = ds.squeeze().isel({s_dim: idx}).compute()
-            if profile.dims: 
-                # Rename the vertical dimension to 'level' for consistency
-                profile = profile.rename({profile.dims[0]: 'level'})
-            
-            # Drop unnecessary coordinates but keep the data
-            loc_vars[var] = profile.drop_vars([c for c in profile.coords if c not in profile.dims])
+            loc_vars[var] = xr.DataArray(arr[j], dims=dims)
 
         ds_out = xr.Dataset(loc_vars)
-        valid_time = ref + datetime.timedelta(hours=h)
         ds_out.attrs = {
             "location": name, 
-            "ref_time": ref.isoformat(), 
+            "ref_time": ref_iso, 
             "horizon": h,
-            "valid_time": valid_time.isoformat()
+            "valid_time": valid_iso
         }
-        ds_out.to_netcdf(path)
-
-def process_wind_maps(fields, tag, h_int, ref):
+        if writer: writer.submit(ds_out, path, TRACE_COMPLEVEL)
+        else: write_nc(ds_out, path, TRACE_COMPLEVEL)
+        if existing is not None:
+            existing[safe_names[name]].add(filename)
+
+def get_hfl(hhl):
+    """Return (z_f, h_surf) for the static HHL, computed once per HHL object."""
+    if _hfl_cache.get("hhl") is not hhl:
+        vals = hhl.squeeze().values
+        z_f = np.empty_like(vals[:-1])
+        np.add(vals[:-1], vals[1:], out=z_f)
+        z_f *= 0.5
+        _hfl_cache.update(hhl=hhl, z_f=z_f, h_surf=vals[-1])
+    return _hfl_cache["z_f"], _hfl_cache["h_surf"]
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True)
+    def interp_all_levels(z, u, v, h_surf, targets, is_agl):
+        """Interpolate U/V to all target heights in one sweep; z, u, v are cell-major (Ncells, Nlev)."""
+        n_cells, n_lev = z.shape
+        n_t = targets.shape[0]
+        out_u = np.empty((n_t, n_cells), dtype=u.dtype)
+        out_v = np.empty((n_t, n_cells), dtype=v.dtype)
+        for i in prange(n_cells):
+            for l in range(n_t):
+                h = targets[l]
+                off = h_surf[i] if is_agl[l] else 0.0
+                z0 = z[i, 0] - off
+                z_min, z_max = z0, z0
+                found = False
+                for k in range(n_lev - 1):
+                    z1 = z[i, k + 1] - off
+                    z_min, z_max = min(z_min, z1), max(z_max, z1)
+                    if (z0 - h) * (z1 - h) <= 0.0 and z1 != z0:
+                        w = (h - z0) / (z1 - z0)
+                        out_u[l, i] = u[i, k] + w * (u[i, k + 1] - u[i, k])
+                        out_v[l, i] = v[i, k] + w * (v[i, k + 1] - v[i, k])
+                        found = True
+                        break
+                    z0 = z1
+                if not found:
+                    # Same clamping as metpy: lowest level below the column, top level above it
+                    if z_min >= h:
+                        out_u[l, i], out_v[l, i] = u[i, n_lev - 1], v[i, n_lev - 1]
+                    elif z_max <= h:
+                        out_u[l, i], out_v[l, i] = u[i, 0], v[i, 0]
+                    else:
+                        out_u[l, i], out_v[l, i] = np.nan, np.nan
+        return out_u, out_v
+
+def interp_iso(z, f, h):
+    """Linearly interpolate f (Nlev, ...) to height h, clamping out-of-column targets like metpy."""
+    diff = z - h
+    bracket = (diff[:-1] * diff[1:] <= 0) & (diff[:-1] != diff[1:])
+    k = bracket.argmax(axis=0)[np.newaxis]
+    z0, z1 = np.take_along_axis(z, k, 0)[0], np.take_along_axis(z, k + 1, 0)[0]
+    f0, f1 = np.take_along_axis(f, k, 0)[0], np.take_along_axis(f, k + 1, 0)[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res = f0 + (h - z0) / (z1 - z0) * (f1 - f0)
+    res[~bracket.any(axis=0)] = np.nan
+    res = np.where(z.min(axis=0) >= h, f[-1], res)
+    return np.where(z.max(axis=0) <= h, f[0], res)
+
+def process_wind_maps(fields, tag, h_int, ref, writer=None):
     if "U" not in fields or "V" not in fields or "HHL" not in fields:
         missing = [k for k in ["U", "V", "HHL"] if k not in fields]
         log(f"process_wind_maps aborting. Missing fields: {missing}", "ERROR")
@@ -212,18 +575,26 @@ def process_wind_maps(fields, tag, h_int, ref):
     # Load WIND_LEVELS from JSON if not already loaded available globally or passed
     # For now assuming global WIND_LEVELS is populated in main/config
     
-    from metpy.interpolate import interpolate_to_isosurface
-    u, v, hhl = fields["U"].squeeze(), fields["V"].squeeze(), fields["HHL"].squeeze()
+    u, v = fields["U"].squeeze(), fields["V"].squeeze()
     
     try:
-        z_dim = hhl.dims[0]
-        z_f = (hhl.isel({z_dim: slice(0,-1)}).values + hhl.isel({z_dim: slice(1,None)}).values) / 2
-        h_surf = hhl.isel({z_dim: -1})
-        
+        np_z, h_surf = get_hfl(fields["HHL"])
         np_u, np_v = u.values, v.values
-        np_z = z_f
         
-        for lvl in WIND_LEVELS:
+        if HAS_NUMBA and WIND_LEVELS:
+            # All levels at once on cell-major copies so each column walk is contiguous
+            n_lev = np_z.shape[0]
+            all_u, all_v = interp_all_levels(
+                np.ascontiguousarray(np_z.reshape(n_lev, -1).T),
+                np.ascontiguousarray(np_u.reshape(n_lev, -1).T),
+                np.ascontiguousarray(np_v.reshape(n_lev, -1).T),
+                np.ravel(h_surf),
+                np.array([lvl['h'] for lvl in WIND_LEVELS], dtype=np.float64),
+                np.array([lvl['type'] == 'AGL' for lvl in WIND_LEVELS]))
+        
+        # Same timestamps for every level
+        ref_iso, valid_iso = ref.isoformat(), (ref + datetime.timedelta(hours=h_int)).isoformat()
+        for i, lvl in enumerate(WIND_LEVELS):
             try:
                 # New Naming: Wind_[Type]_[Level]_[RunTag]_H[horizon].nc
                 fname = f"Wind_{lvl['type']}_{lvl['name']}_{tag}_H{h_int:02d}.nc"
@@ -233,9 +604,13 @@ def process_wind_maps(fields, tag, h_int, ref):
                 
                 if os.path.exists(output_path): continue
 
-                target_z = np_z - h_surf.values if lvl['type'] == 'AGL' else np_z
-                res_u = interpolate_to_isosurface(target_z, np_u, lvl['h'])
-                res_v = interpolate_to_isosurface(target_z, np_v, lvl['h'])
+                if HAS_NUMBA:
+                    res_u = all_u[i].reshape(np_u.shape[1:])
+                    res_v = all_v[i].reshape(np_v.shape[1:])
+                else:
+                    target_z = np_z - h_surf if lvl['type'] == 'AGL' else np_z
+                    res_u = interp_iso(target_z, np_u, lvl['h'])
+                    res_v = interp_iso(target_z, np_v, lvl['h'])
                 
                 spatial = u.dims[-1]
                 coords = {spatial: u[spatial], "latitude": u.latitude, "longitude": u.longitude}
@@ -244,16 +619,16 @@ def process_wind_maps(fields, tag, h_int, ref):
                     f"u_{lvl['name']}": xr.DataArray(res_u, dims=[spatial], coords=coords),
                     f"v_{lvl['name']}": xr.DataArray(res_v, dims=[spatial], coords=coords)
                 })
-                valid_time = ref + datetime.timedelta(hours=h_int)
                 out_ds.attrs = {
                     "level_name": lvl['name'], 
                     "level_type": lvl['type'], 
                     "level_h": lvl['h'], 
-                    "ref_time": ref.isoformat(),
+                    "ref_time": ref_iso,
                     "horizon": h_int,
-                    "valid_time": valid_time.isoformat()
+                    "valid_time": valid_iso
                 }
-                out_ds.to_netcdf(output_path)
+                if writer: writer.submit(out_ds, output_path, MAP_COMPLEVEL)
+                else: write_nc(out_ds, output_path, MAP_COMPLEVEL)
                 log(f"Saved wind map: {fname}")
             except Exception as e: log(f"Error processing level {lvl['name']}: {e}", "ERROR")
 
@@ -266,8 +641,7 @@ def main():
     global WIND_LEVELS
     try:
         if os.path.exists("wind_levels.json"):
-            with open("wind_levels.json", "r") as f:
-                WIND_LEVELS = json.load(f)
+            WIND_LEVELS = load_json("wind_levels.json")
             log(f"Loaded {len(WIND_LEVELS)} wind levels from config.")
         else:
             log("Warning: wind_levels.json not found! Wind maps will be skipped.", "WARNING")
@@ -277,13 +651,15 @@ def main():
     cleanup_old_runs() # Cleanup BEFORE downloading to free space
     download_static_files()
     if not os.path.exists("locations.json"): return
-    with open("locations.json", "r", encoding="utf-8") as f: locations = json.load(f)
+    locations = load_json("locations.json")
 
     runs = get_latest_available_runs(limit=3)
     if not runs: log("No runs found."); return
 
     hhl = load_static_hhl()
-    grid = load_static_grid()
+    grid, grid_tree = load_grid_and_tree()
+    # Resolved once per invocation with a single KD-tree query, then reused for every horizon
+    indices = get_location_indices(grid_tree, locations) if grid else None
 
     if hhl is not None and grid is not None:
         # Inject coords into HHL so it can serve as a sample for process_traces
@@ -291,49 +667,97 @@ def main():
         match_dim = next((d for d in hhl.dims if hhl.sizes[d] == n_grid), None)
         if match_dim:
             hhl = hhl.assign_coords({
-                "latitude": (match_dim, grid['lat'].values),
-                "longitude": (match_dim, grid['lon'].values)
+                "latitude": (match_dim, grid['lat']),
+                "longitude": (match_dim, grid['lon'])
             })
 
+    pool = ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS)
+    writer = BackgroundWriter()
+    try:
+        process_runs(runs, locations, hhl, grid, indices, pool, writer)
+    finally:
+        pool.shutdown()
+        writer.close()
+
+    log("--- Data Fetcher Complete ---", "NOTICE")
+
+def discard_downloads(inflight):
+    """Cancels queued fetch_var futures ({h: {var: future}}) and removes files already downloaded."""
+    for futures in inflight.values():
+        for fut in (futures or {}).values():
+            if fut.cancel(): continue
+            try: tmp = fut.result()
+            except Exception: continue
+            if tmp and os.path.exists(tmp): os.remove(tmp)
+    inflight.clear()
+
+def process_runs(runs, locations, hhl, grid, indices, pool, writer):
+    maps_needed = ENABLE_WIND_MAPS and bool(WIND_LEVELS)
+    safe_names = {name: sanitize_name(name) for name in locations}
     for ref_time in runs:
         tag = ref_time.strftime('%Y%m%d_%H%M')
-        max_h = 45 if ref_time.hour == 3 else 33
+        max_h = MAX_HORIZON if ref_time.hour == 3 else 33
         if is_run_complete_locally(tag, locations, max_h):
             log(f"Run {tag} complete locally."); break
         
         log(f"Processing run: {tag}")
+        existing = scan_trace_files(tag)
+        try:
+            assets = list_run_assets(ref_time)
+            log(f"Listed {len(assets)} assets for run {tag}")
+        except Exception as e:
+            log(f"Asset listing failed, resolving per horizon: {e}", "WARNING")
+            assets = {}
         any_success = False
-        for h in range(max_h + 1):
-            iso_h = get_iso_horizon(h)
-            valid_time_str = (ref_time + datetime.timedelta(hours=h)).strftime('%Y-%m-%dT%H:%M:%SZ')
-            # Only log detailed info if we actually have chance of finding data
-            
-            fields = {"HHL": hhl} if hhl is not None else {}
-            has_new_data = False
-            for var in ["T", "U", "V", "P", "QV"]:
+        # Downloads are network-bound and independent: run them concurrently and keep the
+        # next horizon(s) downloading while this one is decoded with cfgrib on this thread
+        # (eccodes isn't safely reentrant)
+        def submit(h):
+            # Nothing to request if every location already has this horizon
+            if horizon_cached(h): return None
+            return {var: pool.submit(fetch_var, var, ref_time, ISO_HORIZONS[h], tag, h, assets.get((var, h))) for var in VARS_TRACES}
+        def horizon_cached(h):
+            if maps_needed: return False
+            fname = TRACE_FILENAMES[h]
+            return all(fname in existing.get(safe, ()) for safe in safe_names.values())
+        inflight = {h: submit(h) for h in range(min(HORIZON_PREFETCH, max_h + 1))}
+        try:
+            for h in range(max_h + 1):
+                fields = {"HHL": hhl} if hhl is not None else {}
+                has_new_data = False
+                if h + HORIZON_PREFETCH <= max_h:
+                    inflight[h + HORIZON_PREFETCH] = submit(h + HORIZON_PREFETCH)
+                futures = inflight.pop(h)
+                if futures is None:
+                    any_success = True
+                    continue
+                tmps = []
                 try:
-                    req = ogd_api.Request(collection="ogd-forecasting-icon-ch1", variable=var,
-                                         reference_datetime=ref_time, horizon=iso_h, perturbed=False)
-                    urls = ogd_api.get_asset_urls(req)
-                    if urls:
-                        tmp = f"temp_{var}_{tag}_{h:02d}.grib2"
-                        if download_file(urls[0], tmp):
-                            ds = xr.open_dataset(tmp, engine='cfgrib', backend_kwargs={'indexpath': ''})
-                            data = ds[next(iter(ds.data_vars))].load()
-                            if grid:
-                                m_dim = next(d for d in data.dims if data.sizes[d] == grid['lat'].size)
-                                data = data.assign_coords({"latitude": (m_dim, grid['lat'].values), "longitude": (m_dim, grid['lon'].values)})
-                            fields[var] = data
-                            ds.close()
-                            os.remove(tmp)
-                            has_new_data = True
-                except: pass
-            
-            if has_new_data:
-                process_traces(fields, locations, tag, h, ref_time)
-                # process_wind_maps(fields, tag, h, ref_time)
-                log(f"H+{h:02d} done")
-                any_success = True
+                    for var, fut in futures.items():
+                        try:
+                            tmp = fut.result()
+                            if tmp:
+                                tmps.append(tmp)
+                                fields[var] = load_var(tmp, grid, lazy=not maps_needed)
+                                has_new_data = True
+                        except Exception as e:
+                            # One bad variable shouldn't cost the rest of the horizon
+                            log(f"{var} H+{h:02d} failed: {e}", "WARNING")
+                
+                    if has_new_data:
+                        process_traces(fields, locations, tag, h, ref_time, existing=existing, safe_names=safe_names, indices=indices, writer=writer)
+                        if maps_needed: process_wind_maps(fields, tag, h, ref_time, writer=writer)
+                        log(f"H+{h:02d} done")
+                        any_success = True
+                finally:
+                    for var, data in fields.items():
+                        if var != "HHL": data.close()
+                    for tmp in tmps:
+                        if os.path.exists(tmp): os.remove(tmp)
+        finally:
+            # Only non-empty after an error: drop whatever was still downloading
+            discard_downloads(inflight)
+            writer.drain()
         
         if any_success:
             log(f"Run {tag} processing complete.", "NOTICE")
@@ -347,20 +771,41 @@ def main():
                     try: shutil.rmtree(p)
                     except: pass
 
-    log("--- Data Fetcher Complete ---", "NOTICE")
+def _parallel_rmtree(path, pool):
+    """rmtree with the per-file unlinks spread over `pool`; directories are removed bottom-up after."""
+    dirs, stack, futures = [path], [path], []
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                    stack.append(entry.path)
+                else:
+                    futures.append(pool.submit(os.unlink, entry.path))
+    for fut in futures: fut.result()
+    # Every directory is listed after its parent
+    for d in reversed(dirs): os.rmdir(d)
 
 def cleanup_old_runs():
     ret = os.environ.get("RETENTION_DAYS")
     if not ret: return
     cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=int(ret))
+    expired = []
     for d in [CACHE_DIR_TRACES, CACHE_DIR_MAPS]:
         if not os.path.exists(d): continue
-        for item in os.listdir(d):
-            path = os.path.join(d, item)
-            try:
-                dt = datetime.datetime.strptime(item, "%Y%m%d_%H%M").replace(tzinfo=datetime.timezone.utc)
-                if dt < cutoff: shutil.rmtree(path)
-            except: pass
+        # Run dirs are named after their ref time; scandir's cached d_type skips stray files for free
+        with os.scandir(d) as it:
+            for entry in it:
+                if not entry.is_dir(follow_symlinks=False): continue
+                try:
+                    dt = datetime.datetime.strptime(entry.name, "%Y%m%d_%H%M").replace(tzinfo=datetime.timezone.utc)
+                    if dt < cutoff: expired.append(entry.path)
+                except ValueError: pass
+    if not expired: return
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for path in expired:
+            try: _parallel_rmtree(path, pool)
+            except Exception as e: log(f"Cleanup of {path} failed: {e}", "WARNING")
 
 if __name__ == "__main__":
     main()
@@ -6,16 +6,27 @@ import metpy.calc as mpcalc
 import xarray as xr
 import os, datetime, glob
 import numpy as np
+import importlib.util
+# Only probed here; xarray imports the backend itself when open_trace selects it
+HAS_H5NETCDF = importlib.util.find_spec("h5netcdf") is not None
 
 # --- Configuration ---
 CACHE_DIR = "cache_data"
 OUTPUT_DIR = "plots"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Per-file diagnostics (ICON_DEBUG=1); off by default to keep the plot loop quiet
+DEBUG = bool(os.environ.get("ICON_DEBUG"))
+
+def dbg(msg):
+    if DEBUG: print(msg, flush=True)
+
+def open_trace(path):
+    """Trace files hold plain float columns: skip CF decoding and use the lighter h5netcdf backend."""
+    return xr.open_dataset(path, engine="h5netcdf" if HAS_H5NETCDF else None, decode_cf=False)
 
 def generate_plot(file_path):
     """Processes a single NetCDF file and saves a Skew-T plot."""
     try:
-        ds = xr.open_dataset(file_path)
+        ds = open_trace(file_path)
         
         # Metadata from attributes
         loc_name = ds.attrs.get("location", "Unknown")
@@ -27,8 +38,8 @@ def generate_plot(file_path):
         # This turns (1, 80) into (80,)
         p = ds["P"].values.squeeze() * units.Pa
         t = (ds["T"].values.squeeze() * units.K).to(units.degC)
-        u_ms = ds["U"].values.squeeze() * units('m/s')
-        v_ms = ds["V"].values.squeeze() * units('m/s')
+        u_ms = ds["U"].values.squeeze()
+        v_ms = ds["V"].values.squeeze()
         hum = ds["HUM"].values.squeeze()
         
         if ds.attrs.get("HUM_TYPE") == "RELHUM":
@@ -39,29 +50,24 @@ def generate_plot(file_path):
         if "HEIGHT" in ds:
             # Use real height from model (in meters)
             z = (ds["HEIGHT"].values.squeeze() * units.m).to(units.km)
-            print(f"Using real HEIGHT for {loc_name}")
+            dbg(f"Using real HEIGHT for {loc_name}")
         elif "H" in ds: # Alternative naming
             z = (ds["H"].values.squeeze() * units.m).to(units.km)
         else:
             # Fallback to approximation
             z = mpcalc.pressure_to_height_std(p).to(units.km)
-            print(f"Using ISA approximation for {loc_name}")
-        
-        # Wind conversion
-        u_kmh = u_ms.to('km/h').m
-        v_kmh = v_ms.to('km/h').m
-        wind_speed_kmh = mpcalc.wind_speed(u_ms, v_ms).to('km/h').m
-
-        # Sorting and Masking
-        inds = z.argsort()
-        z_plot = z[inds].m
-        t_plot, td_plot = t[inds].m, td[inds].m
-        u_plot, v_plot, wind_plot = u_kmh[inds], v_kmh[inds], wind_speed_kmh[inds]
+            dbg(f"Using ISA approximation for {loc_name}")
         
+        # Masking and Sorting on plain arrays: drop levels above z_max first, sort only the rest
         z_max = 7.0
-        mask = z_plot <= z_max
-        z_plot, t_plot, td_plot, wind_plot = z_plot[mask], t_plot[mask], td_plot[mask], wind_plot[mask]
-        u_plot, v_plot = u_plot[mask], v_plot[mask]
+        z_km = z.m
+        keep = np.flatnonzero(z_km <= z_max)
+        inds = keep[np.argsort(z_km[keep])]
+        z_plot = z_km[inds]
+        t_plot, td_plot = t.m[inds], td.m[inds]
+        # Wind in km/h
+        u_plot, v_plot = u_ms[inds] * 3.6, v_ms[inds] * 3.6
+        wind_plot = np.hypot(u_plot, v_plot)
 
         # Skew Logic
         SKEW_FACTOR = 5 
@@ -83,11 +89,13 @@ def generate_plot(file_path):
         p_ref = mpcalc.height_to_pressure_std(z_ref)
         ax1.grid(True, axis='y', color='gray', alpha=0.3)
 
-        # Draw Isotherms
-        for temp_base in range(-150, 151, 5):
-            xb, xt = skew_x(temp_base, 0), skew_x(temp_base, z_max)
-            if max(xb, xt) >= (min_x-padding) and min(xb, xt) <= (max_x+padding):
-                ax1.plot([xb, xt], [0, z_max], color='blue', alpha=0.06, zorder=1)
+        # Draw Isotherms (one collection; only those crossing the visible x range)
+        temp_base = np.arange(-150, 151, 5)
+        xb, xt = skew_x(temp_base, 0), skew_x(temp_base, z_max)
+        vis = (np.maximum(xb, xt) >= min_x - padding) & (np.minimum(xb, xt) <= max_x + padding)
+        iso = np.stack([np.column_stack([xb[vis], np.zeros(vis.sum())]),
+                        np.column_stack([xt[vis], np.full(vis.sum(), z_max)])], axis=1)
+        ax1.add_collection(LineCollection(iso, colors='blue', alpha=0.06, zorder=1))
 
         # Draw Thermo Data (Lapse Rate Coloring)
         dt, dz = np.diff(t_plot), np.diff(z_plot)
@@ -125,6 +133,8 @@ def generate_plot(file_path):
         return False
 
 def main():
+    # Created here rather than at import, so app.py can reuse open_trace without side effects
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     files = glob.glob(os.path.join(CACHE_DIR, "*.nc"))
     if not files:
         print("No data to plot.")
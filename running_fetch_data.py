@@ -22,6 +22,8 @@ if defs_to_use:
     print(f"Set GRIB definitions to: {final_def_path}", flush=True)
 
 from meteodatalab import ogd_api
+# Asset URL lookups are memoised there, so running this after fetch_data.py repeats none of them
+import fetch_data
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -386,21 +388,15 @@ def main():
         try:
              log(f"Checking server for {tag} (Available check)...")
              
-             # Check start
-             req_start = ogd_api.Request(collection="ogd-forecasting-icon-ch1", variable="T",
-                                 reference_datetime=run, horizon="P0DT0H", perturbed=False)
-             
              # Check end (to ensure upload is mostly complete)
              iso_end = get_iso_horizon(max_h)
-             req_end = ogd_api.Request(collection="ogd-forecasting-icon-ch1", variable="T",
-                                 reference_datetime=run, horizon=iso_end, perturbed=False)
 
              log("- Checking Start Horizon...")
              # Use get_asset_urls to check availability WITHOUT downloading/opening the file
-             urls_start = ogd_api.get_asset_urls(req_start)
+             urls_start = fetch_data.get_asset_urls_cached("T", run.isoformat(), "P0DT0H")
              
              log("- Checking End Horizon...")
-             urls_end = ogd_api.get_asset_urls(req_end)
+             urls_end = fetch_data.get_asset_urls_cached("T", run.isoformat(), iso_end)
              
              start_ok = len(urls_start) > 0
              end_ok = len(urls_end) > 0
@@ -494,11 +490,8 @@ def main():
         for var in vars_to_fetch:
             # Print separate progress dot potentially or handle failure
             try:
-                req = ogd_api.Request(collection="ogd-forecasting-icon-ch1", variable=var,
-                                     reference_datetime=ref_time, horizon=iso_h, perturbed=False)
-                
                 # Manual fetch to avoid ogd_api hang/locking
-                urls = ogd_api.get_asset_urls(req)
+                urls = fetch_data.get_asset_urls_cached(var, ref_time.isoformat(), iso_h)
                 if urls:
                     target_url = urls[0]
                     temp_filename = f"temp_{var}_{time_tag}_{h_int:02d}.grib2"
@@ -0,0 +1,104 @@
+import os
+import sys
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Real GRIBs survive between sessions (one folder per run), so warm reruns skip the download
+GRIB_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_gribs")
+REAL_VARS = ["U", "V"]  # We need U and V for wind maps
+# Asset URLs found during discovery, {(ref_time, var): url}, so downloads don't look them up again
+_asset_urls = {}
+
+
+def run_dir(ref_time):
+    return os.path.join(GRIB_CACHE, ref_time.strftime('%Y%m%d_%H%M'))
+
+
+def real_grib_path(ref_time, var):
+    return os.path.join(run_dir(ref_time), f"{var}.grib2")
+
+
+def asset_url(ref_time, var):
+    """H+00 asset URL of var in the given run, or None."""
+    import fetch_data
+    from meteodatalab import ogd_api
+
+    if (ref_time, var) not in _asset_urls:
+        req = ogd_api.Request(collection="ogd-forecasting-icon-ch1", variable=var,
+                              reference_datetime=ref_time, horizon=fetch_data.get_iso_horizon(0), perturbed=False)
+        urls = ogd_api.get_asset_urls(req)
+        _asset_urls[(ref_time, var)] = urls[0] if urls else None
+    return _asset_urls[(ref_time, var)]
+
+
+def fetch_real_grib(ref_time, var):
+    """Cached path of the H+00 GRIB of var, downloading it first if needed; None if not published."""
+    import fetch_data
+
+    path = real_grib_path(ref_time, var)
+    if os.path.exists(path): return path
+    url = asset_url(ref_time, var)
+    if url is None: return None
+    # Unique temp name + rename: a partial or concurrent (xdist) download never shows up as cached
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+    ok = fetch_data.download_file(url, tmp)
+    if not ok:
+        if os.path.exists(tmp): os.remove(tmp)
+        return None
+    os.replace(tmp, path)
+    return path
+
+
+@pytest.fixture(params=REAL_VARS)
+def real_var(request):
+    """Each of REAL_VARS in turn; parametrizes the tests that use it."""
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def real_grib():
+    """fetch_real_grib, so tests don't have to import conftest as a module."""
+    return fetch_real_grib
+
+
+@pytest.fixture(scope="session")
+def valid_run():
+    """Newest of the latest 3 runs with H+00 assets for all REAL_VARS (a fully cached one wins), or None."""
+    import fetch_data
+
+    runs = fetch_data.get_latest_available_runs(limit=3)
+    for r in runs:
+        if all(os.path.exists(real_grib_path(r, var)) for var in REAL_VARS):
+            print(f"Using cached GRIBs of run {r}")
+            return r
+
+    for r in runs:
+        # Quick check that every variable has assets, all lookups at once
+        with ThreadPoolExecutor(max_workers=len(REAL_VARS)) as ex:
+            urls = list(ex.map(lambda var: asset_url(r, var), REAL_VARS))
+        print(f"Run {r}: URLs found: {sum(u is not None for u in urls)}/{len(REAL_VARS)}")
+        if all(urls):
+            # Only the run in use is kept
+            if os.path.isdir(GRIB_CACHE):
+                for entry in os.scandir(GRIB_CACHE):
+                    if entry.path != run_dir(r): shutil.rmtree(entry.path, ignore_errors=True)
+            os.makedirs(run_dir(r), exist_ok=True)
+            return r
+    return None
+
+
+@pytest.fixture(scope="session")
+def real_gribs(valid_run):
+    """(ref_time, {var: grib path}) for H+00 of valid_run, or None if anything is missing."""
+    if valid_run is None: return None
+    # Download whatever isn't cached yet concurrently
+    with ThreadPoolExecutor(max_workers=len(REAL_VARS)) as ex:
+        paths = dict(zip(REAL_VARS, ex.map(lambda var: fetch_real_grib(valid_run, var), REAL_VARS)))
+    if not all(paths.values()): return None
+    return valid_run, paths
@@ -0,0 +1,75 @@
+import datetime
+import errno
+import io
+import os
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fetch_data
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.raw = io.BytesIO(body)
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, body):
+        self.body = body
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.body)
+
+
+def test_full_tmp_dir_falls_back_to_working_dir(tmp_path, monkeypatch):
+    shm = tmp_path / "shm"
+    shm.mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(fetch_data, "GRIB_TMP_DIR", str(shm))
+    session = FakeSession(b"GRIB" * 1000)
+    monkeypatch.setattr(fetch_data, "get_session", lambda: session)
+    monkeypatch.setattr(fetch_data, "log", lambda *a, **k: None)
+
+    real_open = open
+    def full_open(path, mode="r", *a, **k):
+        # Simulate a tmpfs with no room left
+        if str(path).startswith(str(shm)) and "w" in mode:
+            raise OSError(errno.ENOSPC, "No space left on device", str(path))
+        return real_open(path, mode, *a, **k)
+    monkeypatch.setattr("builtins.open", full_open)
+
+    path = fetch_data.fetch_var("U", None, "P0DT0H", "20990101_0000", 0, url="http://x/U")
+    assert path == "temp_U_20990101_0000_00.grib2"
+    assert (tmp_path / path).read_bytes() == b"GRIB" * 1000
+    # One attempt against the full directory (no retries), then one to disk
+    assert session.calls == 2
+
+
+def test_asset_url_lookups_are_memoised(monkeypatch):
+    calls = []
+    def get_asset_urls(req):
+        calls.append(req)
+        return [f"http://x/{len(calls)}"]
+    monkeypatch.setattr(fetch_data.ogd_api, "get_asset_urls", get_asset_urls)
+    monkeypatch.setattr(fetch_data, "get_session", lambda: None)
+    fetch_data.get_asset_urls_cached.cache_clear()
+
+    ref = datetime.datetime(2099, 1, 1, 0, 0, tzinfo=datetime.timezone.utc)
+    first = fetch_data.get_asset_urls_cached("U", ref.isoformat(), "P0DT1H")
+    assert fetch_data.get_asset_urls_cached("U", ref.isoformat(), "P0DT1H") == first == ("http://x/1",)
+    assert calls[0].reference_datetime == "2099-01-01T00:00:00Z"
+    fetch_data.get_asset_urls_cached("V", ref.isoformat(), "P0DT1H")
+    assert len(calls) == 2
+    fetch_data.get_asset_urls_cached.cache_clear()
@@ -1,72 +1,79 @@
 import os
 import sys
-import shutil
+from pathlib import Path
 import xarray as xr
 import numpy as np
 import datetime
+import pytest
+from metpy.interpolate import interpolate_to_isosurface
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import fetch_data
 
-def test_process_wind_maps_naming():
-    fetch_data.CACHE_DIR_MAPS = "tests/cache_wind"
+# Interpolation paths: the Numba kernel (all levels in one sweep) and the NumPy fallback
+PATHS = [pytest.param(True, id="numba", marks=pytest.mark.skipif(not fetch_data.HAS_NUMBA, reason="numba not installed")),
+         pytest.param(False, id="numpy")]
+
+@pytest.mark.parametrize("use_numba", PATHS)
+def test_process_wind_maps_naming(use_numba, tmp_path, monkeypatch, subtests):
+    monkeypatch.setattr(fetch_data, "CACHE_DIR_MAPS", str(tmp_path))
+    monkeypatch.setattr(fetch_data, "HAS_NUMBA", use_numba)
     
     # 1. Setup Mock Config & Data
-    
-    # Manually inject WIND_LEVELS for test
-    fetch_data.WIND_LEVELS = [
+    monkeypatch.setattr(fetch_data, "WIND_LEVELS", [
         {"name": "10m_AGL",   "h": 10,   "type": "AGL"},
         {"name": "2000m_AMSL","h": 2000, "type": "AMSL"}
-    ]
+    ])
     
     tag = "20990101_1200"
     h_int = 3
     ref = datetime.datetime(2099, 1, 1, 12, 0)
     
-    # Create simple grid (10x10)
-    lats = np.linspace(46, 47, 10)
-    lons = np.linspace(8, 9, 10)
+    # ICON's unstructured grid: one 1-D 'values' dim with lat/lon per cell
+    n_cells = 100
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(46, 47, n_cells)
+    lons = rng.uniform(8, 9, n_cells)
+    coords = {"latitude": ("values", lats), "longitude": ("values", lons)}
     
-    # Create 3D fields (Z=5, Y=10, X=10)
-    data_u = xr.DataArray(np.random.rand(5, 10, 10), 
-                          dims=("generalVerticalLayer", "latitude", "longitude"),
-                          coords={"latitude": ("latitude", lats), "longitude": ("longitude", lons)})
-    data_v = xr.DataArray(np.random.rand(5, 10, 10), 
-                          dims=("generalVerticalLayer", "latitude", "longitude"),
-                          coords={"latitude": ("latitude", lats), "longitude": ("longitude", lons)})
+    # Create 3D fields (Z=5, cells)
+    data_u = xr.DataArray(rng.random((5, n_cells), dtype=np.float32),
+                          dims=("generalVerticalLayer", "values"), coords=coords)
+    data_v = xr.DataArray(rng.random((5, n_cells), dtype=np.float32),
+                          dims=("generalVerticalLayer", "values"), coords=coords)
     
-    # HHL Z=6
-    data_hhl = xr.DataArray(np.linspace(0, 5000, 6).reshape(6,1,1) * np.ones((1,10,10)), 
-                           dims=("generalVerticalLayer_plus1", "latitude", "longitude"),
-                           coords={"latitude": ("latitude", lats), "longitude": ("longitude", lons)})
+    # HHL Z=6, top-down from 6000 m to a varying surface, so 2000 m AMSL lies inside every column
+    # and 10 m AGL below the lowest full level (clamped to it)
+    h_surf = rng.uniform(200, 1500, n_cells).astype(np.float32)
+    hhl = np.linspace(6000, 0, 6, dtype=np.float32)[:, None] * (1 - h_surf / 6000) + h_surf
+    data_hhl = xr.DataArray(hhl, dims=("generalVerticalLayer_plus1", "values"), coords=coords)
 
     fields = {"U": data_u, "V": data_v, "HHL": data_hhl}
     
-    try:
-        # 2. Execution
-        print("Running process_wind_maps...")
-        fetch_data.process_wind_maps(fields, tag, h_int, ref)
-        
-        # 3. Assertions
-        out_dir = os.path.join(fetch_data.CACHE_DIR_MAPS, tag)
-        assert os.path.exists(out_dir), f"Output directory not created: {out_dir}"
-        
-        # Check for specific files
-        # 1. AGL file
-        file_agl = os.path.join(out_dir, f"Wind_AGL_10m_AGL_{tag}_H{h_int:02d}.nc")
-        assert os.path.exists(file_agl), f"AGL wind map missing: {file_agl}"
-        
-        # 2. AMSL file
-        file_amsl = os.path.join(out_dir, f"Wind_AMSL_2000m_AMSL_{tag}_H{h_int:02d}.nc")
-        assert os.path.exists(file_amsl), f"AMSL wind map missing: {file_amsl}"
-        
-        print("Wind map naming and splitting test passed!")
-        
-    finally:
-        # Cleanup
-        if os.path.exists("tests/cache_wind"):
-            shutil.rmtree("tests/cache_wind")
+    # 2. Execution (output goes to pytest's tmp_path, cleaned up by pytest)
+    print("Running process_wind_maps...")
+    fetch_data.process_wind_maps(fields, tag, h_int, ref)
+    
+    # 3. Assertions
+    out_dir = Path(fetch_data.CACHE_DIR_MAPS) / tag
+    assert out_dir.is_dir(), f"Output directory not created: {out_dir}"
+    
+    # Independent reference (metpy, as in test_wind_interp.py) on full-level heights
+    z_f = (hhl[:-1] + hhl[1:]) / 2
+    
+    # Check for specific files, one subtest per level so a missing AGL map doesn't hide the AMSL one
+    for lvl in fetch_data.WIND_LEVELS:
+        with subtests.test(level=lvl["name"]):
+            file_lvl = out_dir / f"Wind_{lvl['type']}_{lvl['name']}_{tag}_H{h_int:02d}.nc"
+            assert file_lvl.exists(), f"{lvl['type']} wind map missing: {file_lvl}"
+            target_z = z_f - h_surf if lvl['type'] == 'AGL' else z_f
+            with xr.open_dataset(file_lvl) as ds:
+                assert ds[f"u_{lvl['name']}"].dims == ("values",)
+                np.testing.assert_allclose(ds[f"u_{lvl['name']}"].values, interpolate_to_isosurface(target_z, data_u.values, lvl['h']), rtol=1e-5)
+                np.testing.assert_allclose(ds[f"v_{lvl['name']}"].values, interpolate_to_isosurface(target_z, data_v.values, lvl['h']), rtol=1e-5)
+    
+    print("Wind map naming and splitting test passed!")
 
 if __name__ == "__main__":
-    test_process_wind_maps_naming()
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -29,9 +29,8 @@ def test_static_download():
     finally:
         # 4. Teardown: Restore backup
         if os.path.exists(backup_path):
-            if os.path.exists(hhl_path):
-                os.remove(hhl_path) # Remove test download
-            os.rename(backup_path, hhl_path)
+            os.replace(backup_path, hhl_path) # Atomically overwrites the test download
 
 if __name__ == "__main__":
-    test_static_download()
+    import pytest
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -1,6 +1,6 @@
 import os
 import sys
-import shutil
+from pathlib import Path
 import xarray as xr
 import numpy as np
 import datetime
@@ -9,54 +9,53 @@ import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import fetch_data
 
-def test_process_traces_naming_and_hhl():
-    fetch_data.CACHE_DIR_TRACES = "tests/cache_data"
+def test_process_traces_naming_and_height(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_data, "CACHE_DIR_TRACES", str(tmp_path))
     
     # 1. Setup Mock Data
     tag = "20990101_1200"
     h = 0
     ref_time = datetime.datetime(2099, 1, 1, 12, 0)
-    locations = {"TestLoc": {"lat": 46.0, "lon": 8.0}}
     
-    # Create simple grid
-    lats = np.array([46.0, 47.0])
-    lons = np.array([8.0, 9.0])
+    # Simple 1-D grid of 4 cells; each location sits on a cell, not in input order
+    lats = np.array([46.0, 46.5, 47.0, 47.5])
+    lons = np.array([8.0, 8.5, 9.0, 9.5])
+    locations = {"Zürich": {"lat": 47.0, "lon": 9.0}, "TestLoc": {"lat": 46.0, "lon": 8.0}}
+    nearest = {"Zürich": 2, "TestLoc": 0}
+    coords = {"latitude": (("values",), lats), "longitude": (("values",), lons)}
     
-    # Create T variable
-    data_t = xr.DataArray(np.random.rand(10, 2), dims=("generalVerticalLayer", "values"), 
-                          coords={"latitude": (("values",), lats), "longitude": (("values",), lons)})
+    rng = np.random.default_rng(0)
+    # Create T variable (10 full levels)
+    data_t = xr.DataArray(rng.random((10, 4), dtype=np.float32), dims=("generalVerticalLayer", "values"), coords=coords)
     
-    # Create HHL variable (Using same dim for test simplicity, although technically n+1)
-    data_hhl = xr.DataArray(np.random.rand(10, 2), dims=("generalVerticalLayer", "values"),
-                            coords={"latitude": (("values",), lats), "longitude": (("values",), lons)})
+    # Create HHL variable: 11 half levels on their own dim, top-down
+    hhl = np.linspace(5000, 0, 11, dtype=np.float32)[:, None] + rng.uniform(300, 600, 4).astype(np.float32)
+    data_hhl = xr.DataArray(hhl, dims=("generalVerticalLayer_plus1", "values"), coords=coords)
     
     fields = {"T": data_t, "HHL": data_hhl}
     
-    try:
-        # 2. Execution
-        fetch_data.process_traces(fields, locations, tag, h, ref_time)
-        
-        # 3. Assertions
-        # Check Directory Structure
-        loc_dir = os.path.join(fetch_data.CACHE_DIR_TRACES, tag, "TestLoc")
-        assert os.path.exists(loc_dir), f"Directory not created: {loc_dir}"
-        
-        # Check Filename
-        expected_name = f"TestLoc_{tag}_H{h:02d}.nc"
-        file_path = os.path.join(loc_dir, expected_name)
-        assert os.path.exists(file_path), f"File name incorrect: {file_path}"
-        
-        # Check Content (HHL presence)
-        ds_out = xr.open_dataset(file_path)
-        assert "HHL" in ds_out.data_vars, "HHL variable missing from trace output!"
-        ds_out.close()
-        
-        print("Traces naming and HHL inclusion test passed!")
+    # 2. Execution (output goes to pytest's tmp_path, cleaned up by pytest)
+    fetch_data.process_traces(fields, locations, tag, h, ref_time)
+    
+    # 3. Assertions
+    for name, idx in nearest.items():
+        # Check Directory Structure: [RunTag]/[Location]/H[horizon].nc
+        loc_dir = Path(fetch_data.CACHE_DIR_TRACES) / tag / fetch_data.sanitize_name(name)
+        assert loc_dir.is_dir(), f"Directory not created: {loc_dir}"
+        file_path = loc_dir / f"H{h:02d}.nc"
+        assert file_path.exists(), f"File name incorrect: {file_path}"
         
-    finally:
-        # Cleanup
-        if os.path.exists("tests/cache_data"):
-            shutil.rmtree("tests/cache_data")
+        # Check Content: the nearest cell's profile, HHL replaced by full-level HEIGHT
+        with xr.open_dataset(file_path) as ds_out:
+            assert "HHL" not in ds_out.data_vars, "Raw HHL should not be written to traces"
+            assert ds_out["T"].dims == ("level",)
+            np.testing.assert_array_equal(ds_out["T"].values, data_t.values[:, idx])
+            np.testing.assert_allclose(ds_out["HEIGHT"].values, (hhl[:-1, idx] + hhl[1:, idx]) / 2)
+            assert ds_out.attrs["location"] == name
+            assert ds_out.attrs["valid_time"] == ref_time.isoformat()
+    
+    print("Traces naming and HEIGHT test passed!")
 
 if __name__ == "__main__":
-    test_process_traces_naming_and_hhl()
+    import pytest
+    sys.exit(pytest.main([__file__, "-s"]))
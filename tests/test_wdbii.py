@@ -0,0 +1,212 @@
+import hashlib
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import download_wdbii
+
+PREFIX = "gshhg-shp-2.3.7/WDBII_shp"
+MEMBERS = {
+    f"{PREFIX}/h/WDBII_river_h_L01.shp": b"shp" * 5000,
+    f"{PREFIX}/h/WDBII_river_h_L01.dbf": b"dbf" * 3000,
+    f"{PREFIX}/h/WDBII_river_h_L01.shx": b"shx" * 100,
+    f"{PREFIX}/h/WDBII_river_h_L01.prj": b'GEOGCS["WGS 84"]',
+    # A river layer without a .shp is skipped as a whole
+    f"{PREFIX}/h/WDBII_river_h_L02.dbf": b"orphan" * 100,
+    # Other resolutions and layer types are not extracted
+    f"{PREFIX}/f/WDBII_river_f_L01.shp": b"full" * 100,
+    f"{PREFIX}/h/WDBII_border_h_L1.shp": b"border" * 100,
+    "gshhg-shp-2.3.7/README.TXT": b"readme",
+}
+WANTED = sorted(f"{PREFIX}/h/WDBII_river_h_L01.{ext}" for ext in ("shp", "dbf", "shx", "prj"))
+
+
+@pytest.fixture
+def archive(monkeypatch):
+    """Small GSHHG-like zip (deflated members plus one stored one), as bytes."""
+    monkeypatch.setattr(download_wdbii, "WDBII_LEVELS", frozenset())
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in MEMBERS.items():
+            z.writestr(name, data, zipfile.ZIP_STORED if name.endswith(".prj") else zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+
+
+def entries_of(archive):
+    n_entries, _, cd_offset = download_wdbii.locate_central_directory(archive)
+    return download_wdbii.parse_central_directory(archive, cd_offset, n_entries)
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200, headers=None):
+        self.raw = io.BytesIO(body)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    @property
+    def content(self):
+        return self.raw.getvalue()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f"HTTP {self.status_code}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RangeSession:
+    """Serves the archive, honouring Range requests unless told otherwise."""
+    def __init__(self, archive, ranges=True):
+        self.archive = archive
+        self.ranges = ranges
+        self.heads = 0
+
+    def get(self, url, headers=None, **kwargs):
+        spec = (headers or {}).get("Range")
+        if not spec or not self.ranges:
+            return FakeResponse(self.archive, 200, {"Content-Length": str(len(self.archive))})
+        start, end = spec[len("bytes="):].split("-")
+        end = int(end) + 1 if end else len(self.archive)
+        return FakeResponse(self.archive[int(start):end], 206)
+
+    def head(self, url, **kwargs):
+        self.heads += 1
+        return FakeResponse(b"", 200, {"Content-Length": str(len(self.archive))})
+
+
+class ScriptedSession:
+    """Returns the queued responses in order and records the request headers."""
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+def test_central_directory_matches_zipfile(archive):
+    infos = zipfile.ZipFile(io.BytesIO(archive)).infolist()
+    assert [(i.filename, i.header_offset, i.compress_size, i.compress_type, i.CRC) for i in infos] == entries_of(archive)
+    # The EOCD search also works on a window that starts inside the archive
+    assert download_wdbii.locate_central_directory(archive, len(archive) - 100) == \
+        download_wdbii.locate_central_directory(archive)
+
+
+def test_select_layers_keeps_complete_river_layers(archive, monkeypatch):
+    assert sorted(e[0] for e in download_wdbii.select_layers(entries_of(archive))) == WANTED
+
+    monkeypatch.setattr(download_wdbii, "WDBII_LEVELS", frozenset({"L02"}))
+    assert download_wdbii.select_layers(entries_of(archive)) == []
+
+
+def test_inflate_entry_matches_zipfile(archive, tmp_path):
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        for entry in entries_of(archive):
+            src = io.BytesIO(archive)
+            src.seek(entry[1])
+            target = tmp_path / os.path.basename(entry[0])
+            download_wdbii.inflate_entry(src, entry, target)
+            assert target.read_bytes() == z.read(entry[0])
+
+
+def test_inflate_entry_rejects_bad_crc_and_truncation(archive, tmp_path):
+    entry = next(e for e in entries_of(archive) if e[0].endswith("L01.shp"))
+    name, offset, comp_size, method, crc = entry
+
+    src = io.BytesIO(archive)
+    src.seek(offset)
+    with pytest.raises(IOError, match="CRC mismatch"):
+        download_wdbii.inflate_entry(src, (name, offset, comp_size, method, crc ^ 1), tmp_path / "bad_crc")
+
+    src = io.BytesIO(archive[:offset + download_wdbii.LFH_SIZE + len(name) + comp_size // 2])
+    src.seek(offset)
+    with pytest.raises(download_wdbii.IncompleteDownload):
+        download_wdbii.inflate_entry(src, entry, tmp_path / "truncated")
+
+
+def test_extract_via_ranges(archive, tmp_path):
+    assert download_wdbii.extract_via_ranges(RangeSession(archive), len(archive), tmp_path)
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(n) for n in WANTED)
+    for name in WANTED:
+        assert (tmp_path / os.path.basename(name)).read_bytes() == MEMBERS[name]
+
+
+def test_extract_via_ranges_without_range_support(archive, tmp_path):
+    # The caller falls back to a full download, nothing is written
+    assert not download_wdbii.extract_via_ranges(RangeSession(archive, ranges=False), len(archive), tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_stream_paths_cache_follows_levels(archive, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_wdbii, "WDBII_DIR", str(tmp_path))
+    monkeypatch.setattr(download_wdbii, "LAYERS_FILE", str(tmp_path / "layers.json"))
+    session = RangeSession(archive)
+
+    shp = f"{PREFIX}/h/WDBII_river_h_L01.shp"
+    assert download_wdbii.stream_paths(session) == [f"/vsizip//vsicurl/{download_wdbii.URL}/{shp}"]
+    assert download_wdbii.stream_paths(session) == download_wdbii.stream_paths(session)
+    assert session.heads == 1
+
+    # A different level selection must not reuse the cached list
+    monkeypatch.setattr(download_wdbii, "WDBII_LEVELS", frozenset({"L02"}))
+    assert download_wdbii.stream_paths(session) == []
+    assert session.heads == 2
+
+
+def test_download_archive_resumes_after_truncation(archive, monkeypatch):
+    monkeypatch.setattr(download_wdbii, "RETRY_BACKOFF", 0)
+    cut = len(archive) // 3
+    headers = {"Content-Length": str(len(archive)), "ETag": '"v1"'}
+    session = ScriptedSession([
+        FakeResponse(archive[:cut], 200, headers),
+        FakeResponse(archive[cut:], 206),
+    ])
+
+    f = io.BytesIO()
+    response_headers, sha256 = download_wdbii.download_archive(session, {}, f)
+    assert f.getvalue() == archive
+    assert sha256 == hashlib.sha256(archive).hexdigest()
+    assert response_headers is headers
+    assert session.requests[1] == {"Range": f"bytes={cut}-", "If-Range": '"v1"'}
+
+
+def test_download_archive_restarts_when_resume_is_ignored(archive, monkeypatch):
+    monkeypatch.setattr(download_wdbii, "RETRY_BACKOFF", 0)
+    headers = {"Content-Length": str(len(archive))}
+    session = ScriptedSession([
+        FakeResponse(archive[:100], 200, headers),
+        FakeResponse(archive, 200, headers),
+    ])
+
+    f = io.BytesIO()
+    _, sha256 = download_wdbii.download_archive(session, {}, f)
+    assert f.getvalue() == archive
+    assert sha256 == hashlib.sha256(archive).hexdigest()
+
+
+def test_download_archive_gives_up_on_short_bodies(archive, monkeypatch):
+    monkeypatch.setattr(download_wdbii, "RETRY_BACKOFF", 0)
+    monkeypatch.setattr(download_wdbii, "MAX_RETRIES", 2)
+    headers = {"Content-Length": str(len(archive))}
+    session = ScriptedSession([
+        FakeResponse(archive[:100], 200, headers),
+        FakeResponse(b"", 206),
+    ])
+
+    with pytest.raises(download_wdbii.IncompleteDownload, match=f"Got 100 of {len(archive)} bytes"):
+        download_wdbii.download_archive(session, {}, io.BytesIO())
+
+
+def test_download_archive_not_modified():
+    session = ScriptedSession([FakeResponse(b"", 304)])
+    assert download_wdbii.download_archive(session, {"If-None-Match": '"v1"'}, io.BytesIO()) is None
@@ -0,0 +1,45 @@
+import os
+import sys
+import numpy as np
+import pytest
+from metpy.interpolate import interpolate_to_isosurface
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fetch_data
+
+def make_column_data(n_lev=20, n_cells=50):
+    rng = np.random.default_rng(0)
+    h_surf = rng.uniform(200, 3000, n_cells)
+    # HHL ordered top to bottom like ICON
+    hhl = (h_surf + np.cumsum(rng.uniform(10, 400, (n_lev + 1, n_cells)), axis=0))[::-1]
+    z_f = (hhl[:-1] + hhl[1:]) / 2
+    u = rng.normal(size=(n_lev, n_cells))
+    v = rng.normal(size=(n_lev, n_cells))
+    return z_f, u, v, hhl[-1]
+
+@pytest.mark.skipif(not fetch_data.HAS_NUMBA, reason="numba not installed")
+def test_interp_all_levels_matches_metpy():
+    z_f, u, v, h_surf = make_column_data()
+    # AGL, AMSL, and targets above / below every column
+    targets = np.array([10.0, 500.0, 2000.0, 1e6, -10.0])
+    is_agl = np.array([True, True, False, False, False])
+
+    out_u, out_v = fetch_data.interp_all_levels(
+        np.ascontiguousarray(z_f.T), np.ascontiguousarray(u.T), np.ascontiguousarray(v.T),
+        h_surf, targets, is_agl)
+
+    for i, (h, agl) in enumerate(zip(targets, is_agl)):
+        z = z_f - h_surf if agl else z_f
+        np.testing.assert_allclose(out_u[i], interpolate_to_isosurface(z, u, h), rtol=1e-6)
+        np.testing.assert_allclose(out_v[i], interpolate_to_isosurface(z, v, h), rtol=1e-6)
+
+def test_interp_iso_matches_metpy():
+    z_f, u, v, h_surf = make_column_data()
+    for h in [10.0, 500.0, 2000.0, 1e6, -10.0]:
+        for z in (z_f, z_f - h_surf):
+            np.testing.assert_allclose(fetch_data.interp_iso(z, u, h),
+                                       interpolate_to_isosurface(z, u, h), rtol=1e-6)
+    # Gridded (Nlev, Y, X) input keeps its horizontal shape
+    z3, u3 = z_f.reshape(-1, 5, 10), u.reshape(-1, 5, 10)
+    assert fetch_data.interp_iso(z3, u3, 1500.0).shape == (5, 10)